@@ -1,15 +1,29 @@
 # main.py
 
-from fastapi import FastAPI, Form, HTTPException
+from fastapi import FastAPI, Form, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 import requests
 import time
+import json
 import asyncio
 import sys
 import os
 from typing import Optional
-from trading import analyze_for_trading, get_trades_with_summary
+from contextlib import asynccontextmanager
+from datetime import datetime
+from trading import get_trades_with_summary, run_trading_universe
+from trade_ledger import InvalidPageRequest
 from indicators import send_telegram
-from screener import run_screener, analyze_stock, fetch_nifty_stocks, get_latest_screener_batch
+from screener import run_screener, analyze_stock, build_screener_engine, fetch_nifty_stocks, get_latest_screener_batch
+from jobs import job_manager, JobAlreadyRunning
+from work_queue import run_queue_screener
+from score_history import run_score_history, get_score_history
+from universe_metadata import refresh_universe_metadata
+from portfolio_summary import rebuild_portfolio_summary
+from response_cache import StaleWhileRevalidateCache
+from write_queue import write_queue
+from scheduler import MarketScheduler, ScheduledJob, every
+from trading_calendar import is_trading_day, session_state, latest_session_date, holiday_name, now_ist, HOLIDAYS_LISTED_THROUGH
 from fastapi.middleware.cors import CORSMiddleware
 #from claude.enhanced_screener import run_ai_enhanced_screening
 from claude.enhanced_screener_no_ml import run_ai_enhanced_screening
@@ -18,7 +32,15 @@ from claude.enhanced_screener_no_ml import run_ai_enhanced_screening
 #Add Claude folder to path
 sys.path.append(os.path.join(os.path.dirname(__file__),'..','claude'))
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Drain writes left queued by a previous process, then start the market-hours jobs
+    write_queue.start()
+    scheduler.start()
+    yield
+    scheduler.stop()
+
+app = FastAPI(lifespan=lifespan)
 print("✅ FastAPI app created")
 
 app.add_middleware(
@@ -35,40 +57,123 @@ app.add_middleware(
 RSI_THRESHOLD = 60
 VOLUME_MULTIPLIER = 2.5
 MACD_SIGNAL_DIFF = 1.0
+STREAM_CHUNK_SIZE = 25
+SCREENER_DATA_TTL = int(os.getenv("SCREENER_DATA_TTL", "900"))  # seconds
+
+screener_data_cache = StaleWhileRevalidateCache(SCREENER_DATA_TTL)
 
 # ------------------------------------------------------------------------------
 # Helper for Screener Data (Non-blocking)
 # ------------------------------------------------------------------------------
+def is_full_match(stock):
+    latest = stock["history"][-1]
+    conditions = [
+        latest["close"] > latest["ema"],
+        latest["rsi"] > RSI_THRESHOLD,
+        latest["macd"] > latest["signal"] + MACD_SIGNAL_DIFF,
+        latest["volume"] > VOLUME_MULTIPLIER * latest["volumeAvg"]
+    ]
+    return sum(conditions) == 4
+
 def generate_screener_data():
-    full_matches = []
+    engine = build_screener_engine(qualifier=is_full_match)
+    stocks = engine.run(fetch_nifty_stocks())
+    return {
+        "stocks": stocks,
+        "bar_ts": engine.stats['last_bar'],
+        "generated_at": datetime.utcnow().isoformat()
+    }
 
+def iter_screener_events(chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield screener events as they happen: a "match" per qualifying stock,
+    a "progress" event after every chunk_size screened tickers and a final
+    "summary". total counts the tickers left after de-duplication and the
+    universe pre-filter; the dropped ones are reported as skipped.
+    """
+    started = time.time()
     tickers = fetch_nifty_stocks()
-    for ticker in tickers:
-        stock = analyze_stock(ticker)
-        if not stock:
-            continue
+    processed = 0
+    matches = 0
+
+    engine = build_screener_engine(qualifier=is_full_match, chunk_size=chunk_size)
+
+    def screened_total():
+        # Duplicates and pre-filtered tickers are counted before the first result
+        return len(tickers) - engine.stats['duplicates'] - engine.stats['prefiltered']
+
+    for _, record, qualified in engine.iter_results(tickers):
+        processed += 1
+        total = screened_total()
+        if qualified:
+            matches += 1
+            yield {"type": "match", "stock": record["result"]}
+        if processed % chunk_size == 0 or processed == total:
+            yield {"type": "progress", "processed": processed, "total": total, "matches": matches}
+
+    yield {
+        "type": "summary",
+        "processed": processed,
+        "total": screened_total(),
+        "skipped": engine.stats['duplicates'] + engine.stats['prefiltered'],
+        "matches": matches,
+        "elapsed_sec": round(time.time() - started, 1)
+    }
 
-        latest = stock["history"][-1]
-        conditions = [
-            latest["close"] > latest["ema"],
-            latest["rsi"] > RSI_THRESHOLD,
-            latest["macd"] > latest["signal"] + MACD_SIGNAL_DIFF,
-            latest["volume"] > VOLUME_MULTIPLIER * latest["volumeAvg"]
-        ]
-        if sum(conditions) == 4:
-            full_matches.append(stock)
+def run_trades_job(job=None, workers=None):
+    return run_trading_universe(fetch_nifty_stocks(), job=job, workers=workers)
 
-        time.sleep(0.2)
+def run_score_history_job(job=None, period="6mo"):
+    return run_score_history(fetch_nifty_stocks(), period=period, job=job)
 
-    return {"stocks": full_matches}
+def keep_warm():
+    # Render sleeps an instance without inbound traffic; ping our own public URL
+    url = os.getenv("RENDER_EXTERNAL_URL")
+    if url:
+        requests.get(f"{url}/ping", timeout=10)
+
+# IST schedules (previously GitHub Actions cron jobs curling these endpoints).
+# PositionManager is not scheduled: its exits would fight trading.py's on the
+# same open trades.
+scheduler = MarketScheduler([
+    ScheduledJob("screener", run_screener, every(60, "09:45", "15:45")),
+    ScheduledJob("trades", run_trades_job, every(60, "10:15", "15:15")),
+    ScheduledJob("universe_metadata", refresh_universe_metadata, ["19:00"], catch_up_minutes=12 * 60),
+    ScheduledJob("keep_warm", keep_warm, every(10, "08:50", "19:10"), background=False, jitter_seconds=0),
+], should_run=lambda job, slot: is_trading_day(slot.date()))
+
+def start_background_job(job_type, target, **kwargs):
+    try:
+        job = job_manager.start(job_type, target, **kwargs)
+    except JobAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job_id": e.job.id})
+    return {"status": "started", "job_id": job.id, "job_type": job_type}
+
+def format_stream_event(event, fmt):
+    payload = json.dumps(event, default=str)
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
 
 # ------------------------------------------------------------------------------
 # API Endpoints
 # ------------------------------------------------------------------------------
 
 @app.get("/screener-data")
-async def screener_data():
-    return await asyncio.to_thread(generate_screener_data)
+async def screener_data(response: Response):
+    payload, cache_status = await asyncio.to_thread(
+        screener_data_cache.get, "screener-data", generate_screener_data
+    )
+    response.headers["X-Cache"] = cache_status
+    return payload
+
+
+@app.get("/screener-stream")
+def screener_stream(format: str = "ndjson"):
+    fmt = "sse" if format == "sse" else "ndjson"
+    media_type = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    events = (format_stream_event(event, fmt) for event in iter_screener_events())
+    return StreamingResponse(events, media_type=media_type)
 
 
 @app.get("/")
@@ -78,11 +183,22 @@ def root():
 
 
 @app.get("/run-screener")
-def trigger_screener():
-    run_screener()
-    print("Request received for running enhanced screening in Run Screener api")
+def trigger_screener(workers: Optional[int] = None, incremental: bool = False):
+    print("Request received for running screener in Run Screener api")
     # run_ai_enhanced_screening(auto_execute=True)
-    return {"status": "✅ Screener executed. Check Telegram for results."}
+    return start_background_job("screener", run_screener, workers=workers, incremental=incremental)
+
+
+@app.get("/refresh-universe-metadata")
+def trigger_universe_metadata_refresh():
+    print("Request received for refreshing universe metadata")
+    return start_background_job("universe_metadata", refresh_universe_metadata)
+
+
+@app.get("/run-queue-screener")
+def trigger_queue_screener(local_workers: int = 2, shard_size: int = 50):
+    print("Request received for running the sharded work-queue screener")
+    return start_background_job("queue_screener", run_queue_screener, local_workers=local_workers, shard_size=shard_size)
 
 
 @app.get("/screener-meta")
@@ -105,18 +221,42 @@ def webhook(data: dict):
 
 
 @app.get("/run-trades")
-def run_trading_strategy():
-    results = []
-    tickers = fetch_nifty_stocks()
+def run_trading_strategy(workers: Optional[int] = None):
+    return start_background_job("trades", run_trades_job, workers=workers)
+
+@app.get("/write-queue")
+def write_queue_status(retry_failed: bool = False):
+    retried = write_queue.retry_failed() if retry_failed else 0
+    return {"status": write_queue.status(), "retried": retried}
 
-    for ticker in tickers:
-        try:
-            analyze_for_trading(ticker)
-            results.append({"ticker": ticker, "status": "processed"})
-        except Exception as e:
-            results.append({"ticker": ticker, "status": f"error - {str(e)}"})
+@app.get("/scheduler")
+def scheduler_status():
+    today = now_ist().date()
+    return {
+        **scheduler.status(),
+        "session": session_state(),
+        "holiday": holiday_name(today),
+        "holidays_listed_through": HOLIDAYS_LISTED_THROUGH,
+        "latest_session_date": latest_session_date().isoformat()
+    }
 
-    return {"message": "Trading logic executed", "results": results}
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": job_manager.list()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
 
 @app.get("/ping")
 def ping():
@@ -124,22 +264,42 @@ def ping():
     return {"status": "ok"}
 
 @app.get("/screener-latest")
-def screener_latest():
+def screener_latest(request: Request):
     print("Fetch latest stocks from Screener")
-    return get_latest_screener_batch()
+    batch = get_latest_screener_batch()
+    etag = f'"batch-{batch.get("batch_id")}-{len(batch["tickers"])}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(batch, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/run-score-history")
+def trigger_score_history(period: str = "6mo"):
+    print("Request received for building per-bar score history")
+    return start_background_job("score_history", run_score_history_job, period=period)
+
+@app.get("/score-history")
+def score_history(ticker: Optional[str] = None, since: Optional[str] = None, min_score: Optional[float] = None):
+    return {"history": get_score_history(ticker=ticker, since=since, min_score=min_score)}
 
 @app.get("/trades-summary")
-def get_trades_summary(status: str = "open"):
+def get_trades_summary(status: str = "open", limit: int = 100, cursor: Optional[str] = None):
     try:
-        result = get_trades_with_summary(status)
+        result = get_trades_with_summary(status, limit=limit, cursor=cursor)
         return result
+    except InvalidPageRequest as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/rebuild-portfolio-summary")
+def trigger_portfolio_summary_rebuild():
+    print("Request received for rebuilding the portfolio summary")
+    return {"summary": rebuild_portfolio_summary()}
+
+
 # Replace your existing endpoint
 @app.get("/run-enhanced-screening")
-def run_enhanced_screening():
+def run_enhanced_screening(workers: Optional[int] = None):
     print("Request received for running enhanced screening")
-    run_ai_enhanced_screening(auto_execute=True)
-    return {"status": "Enhanced screening completed"}
+    return start_background_job("enhanced_screening", run_ai_enhanced_screening, auto_execute=True, workers=workers)
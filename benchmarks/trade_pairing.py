@@ -0,0 +1,75 @@
+"""
+Benchmark for trade_ledger.pair_trades against the old per-buy scan.
+
+    python benchmarks/trade_pairing.py [--sizes 1000 10000 50000] [--scan-limit 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from trade_ledger import pair_trades
+
+
+def synthetic_trades(count, tickers=500, seed=7):
+    """Chronological BUY/SELL rows: each ticker alternates buy and sell, ~1 in 5 left open"""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 2, 9, 15)
+    trades, open_buys = [], {}
+    for i in range(count):
+        ticker = f"T{rng.randrange(tickers):04d}.NS"
+        stamp = (start + timedelta(minutes=7 * i)).isoformat()
+        if ticker in open_buys and rng.random() < 0.8:
+            action = "SELL"
+            del open_buys[ticker]
+        else:
+            action = "BUY"
+            open_buys[ticker] = True
+        trades.append({
+            "id": i + 1, "ticker": ticker, "action": action, "timestamp": stamp,
+            "price": round(rng.uniform(50, 3000), 2), "quantity": rng.randint(1, 50)
+        })
+    return trades
+
+
+def scan_pairs(trades):
+    """The previous implementation: one generator scan over all trades per buy"""
+    buys = [t for t in trades if t["action"] == "BUY"]
+    return [
+        (buy, next(
+            (s for s in trades if s["action"] == "SELL" and s["ticker"] == buy["ticker"] and s["timestamp"] > buy["timestamp"]),
+            None
+        ))
+        for buy in buys
+    ]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 25000, 50000, 100000])
+    parser.add_argument("--scan-limit", type=int, default=10000, help="Largest size to also time the old scan on")
+    args = parser.parse_args()
+
+    print(f"{'trades':>8} {'indexed ms':>11} {'scan ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        trades = synthetic_trades(size)
+        pairs, indexed_ms = timed(pair_trades, trades)
+        if size <= args.scan_limit:
+            expected, scan_ms = timed(scan_pairs, trades)
+            assert [(b["id"], s and s["id"]) for b, s in pairs] == [(b["id"], s and s["id"]) for b, s in expected]
+            print(f"{size:>8} {indexed_ms:>11.1f} {scan_ms:>10.1f} {scan_ms / indexed_ms:>7.0f}x")
+        else:
+            print(f"{size:>8} {indexed_ms:>11.1f} {'-':>10} {'-':>8}")
+
+
+if __name__ == "__main__":
+    main()
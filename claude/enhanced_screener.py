@@ -1,5 +1,5 @@
-import yfinance as yf
 import pandas as pd
+from market_data import download
 import time
 from datetime import datetime
 from supabase import create_client, Client
@@ -11,6 +11,8 @@ from claude.multi_timeframe_analyzer import MultiTimeframeAnalyzer
 from claude.ml_predictor import MLEnhancedScoring
 from claude.execution_engine import ExecutionEngine
 from claude.risk_manager import RiskManager
+from screening_engine import ScreeningEngine, ScreeningPipeline, BatchFetcher
+from screener import invalidate_latest_screener_batch
 
 # Import existing components
 from indicators import (
@@ -179,50 +181,21 @@ class EnhancedScreener:
         print(f"\n🔍 Running Enhanced Screening Pipeline...")
         print(f"Processing {len(tickers)} stocks...")
         
-        qualified_stocks = []
-        processed_count = 0
+        # Step 1: regime-specific pre-filters, Steps 2-3: multi-timeframe + ML scoring,
+        # Step 4: final qualification check
+        engine = ScreeningEngine(
+            ScreeningPipeline(self._score_candidate, filters=[self._apply_regime_filters]),
+            fetcher=BatchFetcher(period="3mo"),
+            qualifier=lambda result: result['final_score'] >= self.current_config['SCORE_THRESHOLD'],
+            sinks=[self],
+            workers=1  # Bound methods and the lambda can't be pickled into the process pool
+        )
+        qualified_stocks = engine.run(tickers)
         
-        for ticker in tickers:
-            try:
-                processed_count += 1
-                self.session_stats['total_analyzed'] += 1
-                
-                # Progress reporting
-                if processed_count % 100 == 0:
-                    progress = (processed_count / len(tickers)) * 100
-                    print(f"   Progress: {processed_count}/{len(tickers)} ({progress:.1f}%) - Found: {len(qualified_stocks)}")
-                
-                # Step 1: Basic data validation and regime-specific pre-filters
-                if not self._apply_regime_filters(ticker):
-                    continue
-                
-                self.session_stats['passed_filters'] += 1
-                
-                # Step 2: Multi-timeframe analysis
-                multi_tf_result = self.multi_tf_analyzer.analyze_stock_comprehensive(ticker)
-                if not multi_tf_result:
-                    continue
-                
-                # Step 3: ML-enhanced scoring
-                ml_enhanced_result = self._apply_ml_enhancement(ticker, multi_tf_result)
-                if not ml_enhanced_result:
-                    continue
-                
-                self.session_stats['ml_filtered'] += 1
-                
-                # Step 4: Final qualification check
-                if ml_enhanced_result['final_score'] >= self.current_config['SCORE_THRESHOLD']:
-                    qualified_stocks.append(ml_enhanced_result)
-                    self.session_stats['final_signals'] += 1
-                    
-                    print(f"✅ Qualified: {ticker} (Score: {ml_enhanced_result['final_score']:.2f})")
-                
-                # Rate limiting
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"⚠️ Error processing {ticker}: {e}")
-                continue
+        self.session_stats['total_analyzed'] += engine.stats['total']
+        self.session_stats['passed_filters'] += engine.stats['passed_filters']
+        self.session_stats['ml_filtered'] += engine.stats['scored']
+        self.session_stats['final_signals'] += engine.stats['qualified']
         
         print(f"\n📊 Screening Complete:")
         print(f"   Total Analyzed: {self.session_stats['total_analyzed']}")
@@ -232,55 +205,49 @@ class EnhancedScreener:
         
         return qualified_stocks
     
-    def _apply_regime_filters(self, ticker):
+    def on_result(self, ticker, record, qualified):
+        """Engine sink: report qualified stocks as they are found"""
+        if qualified:
+            print(f"✅ Qualified: {ticker} (Score: {record['result']['final_score']:.2f})")
+    
+    def _score_candidate(self, ticker, df):
         """
-        Apply regime-specific pre-entry filters
+        Multi-timeframe analysis followed by ML-enhanced scoring
         """
-        try:
-            # Download basic data
-            df = yf.download(ticker, period="3mo", interval="1d", progress=False)
-            
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            df.columns.name = None
-            
-            df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
-            df = df.astype(float)
-            
-            if df.empty or len(df) < 50:
-                return False
-            
-            df = calculate_additional_indicators(df)
-            df.dropna(inplace=True)
-            
-            latest = df.iloc[-1]
-            
-            # Get regime-specific filters
-            filters = self.adaptive_config.get_regime_specific_filters(self.current_regime)
-            
-            # Apply filters
-            if latest['RSI'] > filters['skip_rsi_above']:
-                return False
-            
-            if latest['Price_Change_3D'] > filters['skip_price_change_3d_above']:
-                return False
-            
-            if latest['Price_Change_5D'] > filters['skip_price_change_5d_above']:
-                return False
-            
-            if (latest['Volume'] > filters['skip_volume_spike_threshold'] * latest['Volume_avg'] and 
-                latest['Price_Change_1D'] > 7):
-                return False
-            
-            mean_atr = df['ATR'][-21:-1].mean()
-            if latest['ATR'] > filters['skip_atr_multiplier'] * mean_atr:
-                return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"⚠️ Filter error for {ticker}: {e}")
+        multi_tf_result = self.multi_tf_analyzer.analyze_stock_comprehensive(ticker)
+        if not multi_tf_result:
+            return None
+        
+        return self._apply_ml_enhancement(ticker, multi_tf_result)
+    
+    def _apply_regime_filters(self, df):
+        """
+        Apply regime-specific pre-entry filters to an indicator frame
+        """
+        latest = df.iloc[-1]
+        
+        # Get regime-specific filters
+        filters = self.adaptive_config.get_regime_specific_filters(self.current_regime)
+        
+        # Apply filters
+        if latest['RSI'] > filters['skip_rsi_above']:
+            return False
+        
+        if latest['Price_Change_3D'] > filters['skip_price_change_3d_above']:
+            return False
+        
+        if latest['Price_Change_5D'] > filters['skip_price_change_5d_above']:
             return False
+        
+        if (latest['Volume'] > filters['skip_volume_spike_threshold'] * latest['Volume_avg'] and 
+            latest['Price_Change_1D'] > 7):
+            return False
+        
+        mean_atr = df['ATR'][-21:-1].mean()
+        if latest['ATR'] > filters['skip_atr_multiplier'] * mean_atr:
+            return False
+        
+        return True
     
     def _apply_ml_enhancement(self, ticker, multi_tf_result):
         """
@@ -288,7 +255,7 @@ class EnhancedScreener:
         """
         try:
             # Get stock data for ML analysis
-            df = yf.download(ticker, period="6mo", interval="1d", progress=False)
+            df = download(ticker, period="6mo", interval="1d", progress=False)
             
             if isinstance(df.columns, pd.MultiIndex):
                 df.columns = df.columns.get_level_values(0)
@@ -296,7 +263,7 @@ class EnhancedScreener:
             df = calculate_additional_indicators(df)
             
             # Get Nifty data for relative strength
-            nifty_data = yf.download("^NSEI", period="6mo", interval="1d", progress=False)
+            nifty_data = download("^NSEI", period="6mo", interval="1d", progress=False)
             if isinstance(nifty_data.columns, pd.MultiIndex):
                 nifty_data.columns = nifty_data.columns.get_level_values(0)
             
@@ -455,6 +422,7 @@ class EnhancedScreener:
             ]
             
             self.supabase.table("screener_results").insert(results_payload).execute()
+            invalidate_latest_screener_batch()
             
             print(f"✅ Results stored: Batch ID {batch_id}")
             
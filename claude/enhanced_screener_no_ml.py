@@ -1,4 +1,3 @@
-import yfinance as yf
 import pandas as pd
 import time
 from datetime import datetime
@@ -29,11 +28,17 @@ from claude_indicators import advanced_strategy_score
 
 # Import existing components
 from indicators import (
-    calculate_additional_indicators,
     detect_candle_pattern,
     SUPABASE_URL,
     SUPABASE_KEY
 )
+from functools import partial
+from screening_checkpoint import ScreeningCheckpoint
+from screening_engine import ScreeningEngine, ScreeningPipeline, BatchFetcher
+from universe_metadata import UniverseMetadata
+from screener import invalidate_latest_screener_batch
+
+MIN_SIGNAL_SCORE = 2.0
 
 # Import fixed telegram function
 try:
@@ -43,6 +48,77 @@ except ImportError:
     from indicators import send_telegram
     print("⚠️ Using original Telegram function")
 
+def passes_regime_filters(df, filters):
+    """Apply regime-specific pre-entry filters to an indicator frame"""
+    latest = df.iloc[-1]
+
+    if latest['RSI'] > filters['skip_rsi_above']:
+        return False
+
+    if latest['Price_Change_3D'] > filters['skip_price_change_3d_above']:
+        return False
+
+    if latest['Price_Change_5D'] > filters['skip_price_change_5d_above']:
+        return False
+
+    if (latest['Volume'] > filters['skip_volume_spike_threshold'] * latest['Volume_avg'] and
+        latest['Price_Change_1D'] > 7):
+        return False
+
+    if len(df) >= 21:
+        mean_atr = df['ATR'][-21:-1].mean()
+        if pd.notna(mean_atr) and latest['ATR'] > filters['skip_atr_multiplier'] * mean_atr:
+            return False
+
+    return True
+
+def score_traditional(ticker, df, weights, market_regime):
+    """Traditional stock analysis without ML on an indicator frame"""
+    # Detect candle pattern
+    df['Candle'] = "None"
+    df.at[df.index[-1], 'Candle'] = detect_candle_pattern(df)
+
+    latest = df.iloc[-1]
+    previous = df.iloc[-2] if len(df) > 1 else latest
+
+    # Get traditional strategy score
+    score, matched_indicators = advanced_strategy_score(latest, previous)
+
+    # Adjust score based on regime weights (simplified)
+    regime_multiplier = weights.get('price_trend', 1.0)  # Use trend weight as overall multiplier
+    adjusted_score = score * regime_multiplier
+
+    return {
+        "ticker": ticker,
+        "close": round(float(latest['Close']), 2),
+        "ema": round(float(latest['EMA_50']), 2),
+        "rsi": round(float(latest['RSI']), 2),
+        "macd": round(float(latest['MACD']), 2),
+        "signal": round(float(latest['Signal']), 2),
+        "hist": round(float(latest['MACD_Hist']), 2),
+        "volume": int(latest['Volume']),
+        "volumeAvg": int(latest['Volume_avg']),
+        "willr": round(float(latest['WilliamsR']), 2),
+        "atr": round(float(latest['ATR']), 2),
+        "bb_pos": round(float(latest['BB_Position']), 2),
+        "priceChange1D": round(float(latest['Price_Change_1D']), 2),
+        "priceChange3D": round(float(latest['Price_Change_3D']), 2),
+        "priceChange5D": round(float(latest['Price_Change_5D']), 2),
+        "stochK": round(float(latest['Stoch_K']), 2),
+        "stochD": round(float(latest['Stoch_D']), 2),
+        "pattern": latest['Candle'],
+        "score": round(adjusted_score, 2),
+        "base_score": round(score, 2),
+        "matched_indicators": matched_indicators,
+        "market_regime": market_regime,
+        "regime_multiplier": round(regime_multiplier, 2),
+        "analysis_type": "traditional_enhanced"
+    }
+
+def meets_min_score(stock_result):
+    # return stock_result['score'] >= self.current_config['SCORE_THRESHOLD']
+    return stock_result['score'] >= MIN_SIGNAL_SCORE
+
 class EnhancedScreenerNoML:
     """
     AI-Enhanced stock screener WITHOUT ML components
@@ -71,6 +147,7 @@ class EnhancedScreenerNoML:
         self.current_regime = None
         self.current_config = None
         self.processed_tickers = set()  # Track processed tickers in this session
+        self.job = None  # Background job handle (progress / cancellation)
         self.session_stats = {
             'total_analyzed': 0,
             'passed_filters': 0,
@@ -80,10 +157,11 @@ class EnhancedScreenerNoML:
             'duplicate_skips': 0  # Track duplicate skips
         }
     
-    def run_enhanced_screening(self, auto_execute=False):
+    def run_enhanced_screening(self, auto_execute=False, workers=None, job=None):
         """
         Run the enhanced screening process without ML
         """
+        self.job = job
         try:
             print("🚀 Starting AI-Enhanced Stock Screening (No ML)")
             print("=" * 60)
@@ -101,7 +179,11 @@ class EnhancedScreenerNoML:
                 return
             
             # Step 4: Run screening without ML
-            qualified_stocks = self._run_screening_pipeline_no_ml(tickers)
+            qualified_stocks = self._run_screening_pipeline_no_ml(tickers, workers)
+            
+            if job and job.cancelled:
+                print(f"🛑 Screening cancelled after {job.processed} tickers — skipping execution")
+                return
             
             # Step 5: Execute trades if enabled
             if auto_execute and qualified_stocks:
@@ -201,193 +283,59 @@ class EnhancedScreenerNoML:
             print(f"❌ Failed to fetch stocks: {e}")
             return []
     
-    def _run_screening_pipeline_no_ml(self, tickers):
+    def _run_screening_pipeline_no_ml(self, tickers, workers=None):
         """Run screening without ML components"""
         print(f"\n🔍 Running Enhanced Screening Pipeline (No ML)...")
         
-        qualified_stocks = []
-        processed_count = 0
-        
         # Limit for testing
         tickers_to_process = tickers[:1800] if len(tickers) > 1800 else tickers
         
-        for ticker in tickers_to_process:
-            try:
-                processed_count += 1
-                self.session_stats['total_analyzed'] += 1
-                print(processed_count)
-                
-                # Check for duplicates in this session
-                if ticker in self.processed_tickers:
-                    print(f"⚠️ Skipping duplicate ticker in this session: {ticker}")
-                    self.session_stats['duplicate_skips'] += 1
-                    continue
-                
-                self.processed_tickers.add(ticker)
-                
-                # Progress reporting
-                if processed_count % 50 == 0:
-                    progress = (processed_count / len(tickers_to_process)) * 100
-                    print(f"   Progress: {processed_count}/{len(tickers_to_process)} ({progress:.1f}%) - Found: {len(qualified_stocks)}")
-                
-                # Apply regime-specific filters
-                if not self._apply_regime_filters(ticker):
-                    continue
-                
-                self.session_stats['passed_filters'] += 1
-                
-                # Traditional analysis (no ML)
-                stock_result = self._analyze_stock_traditional(ticker)
-                if not stock_result:
-                    continue
-                
-                self.session_stats['traditional_filtered'] += 1
-                    
-                # Check if qualifies
-                # if stock_result['score'] >= self.current_config['SCORE_THRESHOLD']:
-                if stock_result['score'] >= 2.0:
-                    qualified_stocks.append(stock_result)
-                    self.session_stats['final_signals'] += 1
-                    print(f"✅ Qualified: {ticker} (Score: {stock_result['score']:.2f})")
-                
-                # Rate limiting
-                time.sleep(0.05)
-                
-            except Exception as e:
-                print(f"⚠️ Error processing {ticker}: {e}")
-                continue
+        # Resumes an interrupted run from its last checkpoint
+        engine = ScreeningEngine(
+            self._screening_pipeline(),
+            fetcher=BatchFetcher(period="3mo"),
+            qualifier=meets_min_score,
+            sinks=[self],
+            workers=workers,
+            job=self.job,
+            checkpoint=ScreeningCheckpoint("ai_enhanced_no_ml"),
+            seen=self.processed_tickers,
+            universe_filter=UniverseMetadata().tradable
+        )
+        qualified_stocks = engine.run(tickers_to_process)
+        
+        self.session_stats['total_analyzed'] += engine.stats['total']
+        self.session_stats['duplicate_skips'] += engine.stats['duplicates']
+        self.session_stats['passed_filters'] += engine.stats['passed_filters']
+        self.session_stats['traditional_filtered'] += engine.stats['scored']
+        self.session_stats['final_signals'] += engine.stats['qualified']
         
+        self._print_pipeline_stats()
+        return qualified_stocks
+    
+    def _screening_pipeline(self):
+        """Regime filters + traditional scoring for the current regime"""
+        return ScreeningPipeline(
+            partial(
+                score_traditional,
+                weights=self.adaptive_config.get_scoring_weights(self.current_regime),
+                market_regime=self.current_regime
+            ),
+            filters=[partial(passes_regime_filters, filters=self.adaptive_config.get_regime_specific_filters(self.current_regime))]
+        )
+    
+    def on_result(self, ticker, record, qualified):
+        """Engine sink: report qualified stocks as they are found"""
+        if qualified:
+            print(f"✅ Qualified: {ticker} (Score: {record['result']['score']:.2f})")
+    
+    def _print_pipeline_stats(self):
         print(f"\n📊 Screening Complete:")
         print(f"   Total Analyzed: {self.session_stats['total_analyzed']}")
         print(f"   Duplicate Skips: {self.session_stats['duplicate_skips']}")
         print(f"   Passed Filters: {self.session_stats['passed_filters']}")
         print(f"   Traditional Filtered: {self.session_stats['traditional_filtered']}")
         print(f"   Final Signals: {self.session_stats['final_signals']}")
-        
-        return qualified_stocks
-    
-    def _apply_regime_filters(self, ticker):
-        """Apply regime-specific pre-entry filters"""
-        try:
-            df = yf.download(ticker, period="3mo", interval="1d", progress=False)
-            
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            df.columns.name = None
-            
-            df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
-            
-            if df.empty or len(df) < 50:
-                return False
-            
-            df = df.astype(float)
-            df = calculate_additional_indicators(df)
-            df.dropna(inplace=True)
-            
-            if df.empty:
-                return False
-            
-            latest = df.iloc[-1]
-            
-            # Get regime-specific filters
-            filters = self.adaptive_config.get_regime_specific_filters(self.current_regime)
-            
-            # Apply filters
-            if latest['RSI'] > filters['skip_rsi_above']:
-                return False
-            
-            if latest['Price_Change_3D'] > filters['skip_price_change_3d_above']:
-                return False
-            
-            if latest['Price_Change_5D'] > filters['skip_price_change_5d_above']:
-                return False
-            
-            if (latest['Volume'] > filters['skip_volume_spike_threshold'] * latest['Volume_avg'] and 
-                latest['Price_Change_1D'] > 7):
-                return False
-            
-            if len(df) >= 21:
-                mean_atr = df['ATR'][-21:-1].mean()
-                if pd.notna(mean_atr) and latest['ATR'] > filters['skip_atr_multiplier'] * mean_atr:
-                    return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"⚠️ Filter error for {ticker}: {e}")
-            return False
-    
-    def _analyze_stock_traditional(self, ticker):
-        """Traditional stock analysis without ML"""
-        try:
-            df = yf.download(ticker, period="3mo", interval="1d", progress=False)
-            
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            df.columns.name = None
-            
-            df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna()
-            df = df.astype(float)
-            
-            if df.empty or len(df) < 50:
-                return None
-            
-            df = calculate_additional_indicators(df)
-            df.dropna(inplace=True)
-            
-            if df.empty:
-                return None
-            
-            # Detect candle pattern
-            df['Candle'] = "None"
-            df.at[df.index[-1], 'Candle'] = detect_candle_pattern(df)
-            
-            latest = df.iloc[-1]
-            previous = df.iloc[-2] if len(df) > 1 else latest
-            
-            # Get traditional strategy score
-            score, matched_indicators = advanced_strategy_score(latest, previous)
-            
-            # Apply regime-specific scoring weights
-            weights = self.adaptive_config.get_scoring_weights(self.current_regime)
-            
-            # Adjust score based on regime weights (simplified)
-            regime_multiplier = weights.get('price_trend', 1.0)  # Use trend weight as overall multiplier
-            adjusted_score = score * regime_multiplier
-            
-            # Create result
-            result = {
-                "ticker": ticker,
-                "close": round(float(latest['Close']), 2),
-                "ema": round(float(latest['EMA_50']), 2),
-                "rsi": round(float(latest['RSI']), 2),
-                "macd": round(float(latest['MACD']), 2),
-                "signal": round(float(latest['Signal']), 2),
-                "hist": round(float(latest['MACD_Hist']), 2),
-                "volume": int(latest['Volume']),
-                "volumeAvg": int(latest['Volume_avg']),
-                "willr": round(float(latest['WilliamsR']), 2),
-                "atr": round(float(latest['ATR']), 2),
-                "bb_pos": round(float(latest['BB_Position']), 2),
-                "priceChange1D": round(float(latest['Price_Change_1D']), 2),
-                "priceChange3D": round(float(latest['Price_Change_3D']), 2),
-                "priceChange5D": round(float(latest['Price_Change_5D']), 2),
-                "stochK": round(float(latest['Stoch_K']), 2),
-                "stochD": round(float(latest['Stoch_D']), 2),
-                "pattern": latest['Candle'],
-                "score": round(adjusted_score, 2),
-                "base_score": round(score, 2),
-                "matched_indicators": matched_indicators,
-                "market_regime": self.current_regime,
-                "regime_multiplier": round(regime_multiplier, 2),
-                "analysis_type": "traditional_enhanced"
-            }
-            
-            return result
-            
-        except Exception as e:
-            print(f"⚠️ Analysis error for {ticker}: {e}")
-            return None
     
     def _execute_qualified_trades(self, qualified_stocks):
         """Execute trades for qualified stocks"""
@@ -460,6 +408,7 @@ class EnhancedScreenerNoML:
             ]
             
             self.supabase.table("screener_results").insert(results_payload).execute()
+            invalidate_latest_screener_batch()
             print(f"✅ Results stored: Batch ID {batch_id}")
             
         except Exception as e:
@@ -512,7 +461,7 @@ class EnhancedScreenerNoML:
             print(f"⚠️ Error sending summary: {e}")
 
 # Main functions
-def run_ai_enhanced_screening(auto_execute=False):
+def run_ai_enhanced_screening(auto_execute=False, workers=None, job=None):
     """Main function without ML"""
     #if not AI_IMPORTS_OK:
     #    print("❌ AI components not available")
@@ -521,7 +470,8 @@ def run_ai_enhanced_screening(auto_execute=False):
     try:
         print("1")
         screener = EnhancedScreenerNoML()
-        screener.run_enhanced_screening(auto_execute=auto_execute)
+        screener.run_enhanced_screening(auto_execute=auto_execute, workers=workers, job=job)
+        return screener.session_stats
     except Exception as e:
         print(f"❌ Screener failed: {e}")
 
@@ -1,11 +1,17 @@
-import yfinance as yf
 import pandas as pd
+from market_data import download
 import numpy as np
 from datetime import datetime, timedelta
 from supabase import create_client
 from risk_manager import RiskManager, StopLossOptimizer
 from multi_timeframe_analyzer import EntryOptimizer
-from indicators import send_telegram, SUPABASE_URL, SUPABASE_KEY
+from indicators import SUPABASE_URL, SUPABASE_KEY
+from position_book import position_book
+from quote_service import quote_service
+from exit_engine import evaluate_position_updates
+from unit_of_work import TradeUnitOfWork
+from write_queue import write_queue
+from ticker_locks import ticker_locks
 import time
 import json
 
@@ -32,6 +38,7 @@ class ExecutionEngine:
     """
     def __init__(self):
         self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.write_queue = write_queue  # Trade rows and alerts are written behind the signal loop
         self.risk_manager = RiskManager()
         self.stop_optimizer = StopLossOptimizer()
         self.entry_optimizer = EntryOptimizer()
@@ -45,8 +52,14 @@ class ExecutionEngine:
         
     def execute_trade_signal(self, signal_data, market_regime="SIDEWAYS"):
         """
-        Execute a trade based on signal data with intelligent timing
+        Execute a trade based on signal data with intelligent timing.
+        Holds the ticker's lock so it cannot interleave with a trading run or
+        position update for the same symbol.
         """
+        with ticker_locks.hold(signal_data.get('ticker')):
+            return self._execute_trade_signal(signal_data, market_regime)
+    
+    def _execute_trade_signal(self, signal_data, market_regime):
         try:
             ticker = signal_data['ticker']
             print(f"🎯 Executing trade signal for {ticker} (Score: {signal_data.get('score', 0):.2f})")
@@ -120,13 +133,12 @@ class ExecutionEngine:
             execution_result = self._execute_paper_trade(order)
             
             if execution_result['success']:
-                # Send notification
-                self._send_execution_notification(order, execution_result)
-                
                 # Store in database
                 trade_id = self._store_trade_in_db(order, execution_result)
                 
                 if trade_id:
+                    # Queued behind the trade row, so it goes out once the row lands
+                    self._send_execution_notification(order, execution_result)
                     execution_result['trade_id'] = trade_id
                     print(f"✅ Trade executed successfully for {ticker} (ID: {trade_id})")
                     return execution_result
@@ -172,7 +184,7 @@ class ExecutionEngine:
         """
         try:
             # Get recent data
-            data = yf.download(ticker, period="5d", interval="1d", progress=False)
+            data = download(ticker, period="5d", interval="1d", progress=False)
             
             if data.empty:
                 return None
@@ -187,8 +199,10 @@ class ExecutionEngine:
             avg_volume = data['Volume'].rolling(20).mean().iloc[-1]
             atr_ratio = atr / data['Close'].rolling(20).mean().iloc[-1]
             
+            current_price = quote_service.get_quote(ticker)
+            
             return {
-                'current_price': latest['Close'],
+                'current_price': current_price if current_price is not None else latest['Close'],
                 'volume': latest['Volume'],
                 'avg_volume': avg_volume,
                 'atr': atr,
@@ -207,7 +221,7 @@ class ExecutionEngine:
         Get stock data for stop loss calculation
         """
         try:
-            data = yf.download(ticker, period="3mo", interval="1d", progress=False)
+            data = download(ticker, period="3mo", interval="1d", progress=False)
             
             if isinstance(data.columns, pd.MultiIndex):
                 data.columns = data.columns.get_level_values(0)
@@ -329,7 +343,7 @@ class ExecutionEngine:
 🕒 Time: {execution_result['execution_time'].strftime('%H:%M')}
             """
             
-            send_telegram(message.strip())
+            self.write_queue.telegram(message.strip(), keys=[f"ticker:{order['ticker']}"])
             
         except Exception as e:
             print(f"⚠️ Error sending execution notification: {e}")
@@ -378,14 +392,11 @@ class ExecutionEngine:
             # Debug: Print the data being inserted (remove in production)
             print(f"🔍 Inserting trade data: {json.dumps(trade_data, indent=2, default=str)}")
             
-            response = self.supabase.table("trades").insert(trade_data).execute()
-            
-            if response.data:
-                print(f"📝 Trade stored in database: {order['ticker']}")
-                return response.data[0]['id']
-            else:
-                print(f"⚠️ Failed to store trade in database: {response}")
-                return None
+            # The drainer inserts the row and adds it to the position book;
+            # the order id stands in for the row id until then
+            self.write_queue.insert("trades", [trade_data], keys=[f"ticker:{order['ticker']}"])
+            print(f"📝 Trade queued for storage: {order['ticker']}")
+            return str(order['order_id'])
                 
         except Exception as e:
             print(f"❌ Error storing trade in database: {e}")
@@ -413,19 +424,12 @@ class ExecutionEngine:
         try:
             print(f"🔍 Checking existing position for {ticker}...")
             
-            # Check for OPEN positions (try both cases)
-            response = self.supabase.table("trades").select("ticker, status, id").eq("ticker", ticker).execute()
-            
-            if not response.data:
-                print(f"✅ No existing positions in {ticker}")
-                return False
+            # Open positions (status 'OPEN' or 'open') from the shared position book
+            open_positions = position_book.positions_for(ticker)
             
-            # Check for open positions (case-insensitive)
-            open_positions = []
-            for position in response.data:
-                status = position.get('status', '').upper()
-                if status == 'OPEN':
-                    open_positions.append(position)
+            if position_book.has_pending_buy(ticker) or f"ticker:{ticker}" in self.write_queue.pending_keys():
+                print(f"⚠️ A trade for {ticker} is still queued for storage")
+                return True
             
             if open_positions:
                 print(f"⚠️ Already have {len(open_positions)} OPEN position(s) in {ticker}:")
@@ -433,7 +437,7 @@ class ExecutionEngine:
                     print(f"   - Trade ID: {pos.get('id')} Status: {pos.get('status')}")
                 return True
             else:
-                print(f"✅ No OPEN positions in {ticker} (found {len(response.data)} closed positions)")
+                print(f"✅ No OPEN positions in {ticker}")
                 return False
                 
         except Exception as e:
@@ -450,74 +454,94 @@ class PositionManager:
         self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
         self.stop_optimizer = StopLossOptimizer()
         
-    def update_all_positions(self):
+    def update_all_positions(self, job=None):
         """
-        Update all open positions with current prices and trailing stops
+        Update all open positions with current prices and trailing stops.
+        Alerts are sent and the position book updated only once the writes
+        have been applied; a failed write is raised to the caller.
         """
-        try:
-            print("🔄 Updating all open positions...")
-            
-            # Get all open positions
-            response = self.supabase.table("trades").select("*").eq("status", "open").execute()
-            open_positions = response.data
-            
-            if not open_positions:
-                print("ℹ️ No open positions to update")
-                return
-            
-            updated_count = 0
-            closed_count = 0
-            
-            for position in open_positions:
-                try:
-                    update_result = self._update_single_position(position)
+        print("🔄 Updating all open positions...")
+        
+        # Get all open positions
+        open_positions = position_book.open_positions()
+        if job:
+            job.set_total(len(open_positions))
+        
+        if not open_positions:
+            print("ℹ️ No open positions to update")
+            return
+        
+        # One batched quote download and one vectorized exit pass for every open position
+        quotes = quote_service.get_quotes(position['ticker'] for position in open_positions)
+        actions = evaluate_position_updates([
+            {
+                'id': position['id'],
+                'ticker': position['ticker'],
+                'entry': float(position['price']),  # Use existing 'price' column
+                'stop': position.get('stop_loss'),
+                'target_1': position.get('target_1'),
+                'target_2': position.get('target_2'),
+                'target_3': position.get('target_3'),
+                'price': quotes.get(position['ticker'])
+            }
+            for position in open_positions
+        ])
+        
+        updated_count = 0
+        closed_count = 0
+        uow = TradeUnitOfWork(client=self.supabase)
+        
+        for position, action in zip(open_positions, actions):
+            try:
+                with ticker_locks.hold(position['ticker']):
+                    if position_book.get(position['id']) is None:
+                        print(f"ℹ️ {position['ticker']} position {position['id']} was closed meanwhile — skipping")
+                        if job:
+                            job.tick()
+                        continue
+                    update_result = self._apply_position_action(position, action, uow)
+                
+                if update_result['action'] == 'updated':
+                    updated_count += 1
+                elif update_result['action'] == 'closed':
+                    closed_count += 1
+                if job:
+                    job.tick(errors=1 if update_result['action'] == 'error' else 0)
                     
-                    if update_result['action'] == 'updated':
-                        updated_count += 1
-                    elif update_result['action'] == 'closed':
-                        closed_count += 1
-                        
-                except Exception as e:
-                    print(f"⚠️ Error updating position {position['ticker']}: {e}")
-            
-            print(f"✅ Position update complete: {updated_count} updated, {closed_count} closed")
-            
+            except Exception as e:
+                print(f"⚠️ Error updating position {position['ticker']}: {e}")
+                if job:
+                    job.tick(errors=1)
+        
+        try:
+            uow.flush()
         except Exception as e:
-            print(f"❌ Error updating positions: {e}")
+            print(f"❌ Error writing position updates: {e}")
+            if job:
+                job.tick(0, errors=1)
+            raise
+        print(f"✅ Position update complete: {updated_count} updated, {closed_count} closed")
+        return {'updated': updated_count, 'closed': closed_count, 'writes': uow.stats}
     
-    def _update_single_position(self, position):
+    def _apply_position_action(self, position, action, uow):
         """
-        Update a single position with current market data using existing schema
+        Apply an exit engine action to a single position using existing schema
         """
-        ticker = position['ticker']
+        if action['action'] == 'skip':
+            return {'action': 'error', 'reason': action['reason']}
         
-        # Get current price
-        current_price = self._get_current_price(ticker)
-        if not current_price:
-            return {'action': 'error', 'reason': 'Cannot get current price'}
+        current_price = float(action['price'])
+        if action['action'] == 'close':
+            return self._close_position(position, current_price, action['reason'], uow)
         
         entry_price = float(position['price'])  # Use existing 'price' column
-        current_stop = float(position.get('stop_loss', entry_price * 0.95))
         quantity = int(position['quantity'])
+        new_stop, trail_reason = action['new_stop'], action['trail_reason']
         
         # Calculate current P&L
         unrealized_pnl = (current_price - entry_price) * quantity
         pnl_percent = (current_price - entry_price) / entry_price * 100
         
-        # Check if stop loss is hit
-        if current_price <= current_stop:
-            return self._close_position(position, current_price, 'stop_loss')
-        
-        # Check if target is hit
-        target_hit = self._check_targets(position, current_price)
-        if target_hit:
-            return self._close_position(position, current_price, f'target_{target_hit}')
-        
-        # Update trailing stop
-        new_stop, trail_reason = self.stop_optimizer.update_trailing_stop(
-            current_price, entry_price, current_stop
-        )
-        
         # Update position in database using existing/new columns
         update_data = {
             'reason': f"Updated: P&L {pnl_percent:+.1f}%",  # Use existing 'reason' column
@@ -535,45 +559,15 @@ class PositionManager:
         except:
             pass  # New columns not available yet
         
-        self.supabase.table("trades").update(update_data).eq("id", position['id']).execute()
+        uow.update(position['id'], update_data)
         
         # Send update notification if significant change
         if trail_reason == 'stop_trailed' or abs(pnl_percent) > 5:
-            self._send_position_update(position, current_price, unrealized_pnl, new_stop, trail_reason)
+            self._send_position_update(position, current_price, unrealized_pnl, new_stop, trail_reason, uow)
         
         return {'action': 'updated', 'new_stop': new_stop, 'pnl': unrealized_pnl}
     
-    def _get_current_price(self, ticker):
-        """
-        Get current market price for a ticker
-        """
-        try:
-            data = yf.download(ticker, period="1d", interval="1m", progress=False)
-            if not data.empty:
-                if isinstance(data.columns, pd.MultiIndex):
-                    data.columns = data.columns.get_level_values(0)
-                return data['Close'].iloc[-1]
-            return None
-        except:
-            return None
-    
-    def _check_targets(self, position, current_price):
-        """
-        Check if any profit targets are hit
-        """
-        targets = {
-            1: position.get('target_1'),
-            2: position.get('target_2'),
-            3: position.get('target_3')
-        }
-        
-        for target_num, target_price in targets.items():
-            if target_price and current_price >= target_price:
-                return target_num
-        
-        return None
-    
-    def _close_position(self, position, exit_price, exit_reason):
+    def _close_position(self, position, exit_price, exit_reason, uow):
         """
         Close a position and calculate final P&L using existing schema
         """
@@ -611,10 +605,10 @@ class PositionManager:
             except:
                 pass  # New columns not available yet
             
-            self.supabase.table("trades").update(update_data).eq("id", position['id']).execute()
+            uow.update(position['id'], update_data)
             
-            # Send closure notification
-            self._send_closure_notification(position, exit_price, final_pnl, exit_reason, days_held)
+            # Send closure notification once the update is written
+            self._send_closure_notification(position, exit_price, final_pnl, exit_reason, days_held, uow)
             
             print(f"🔒 Position closed: {ticker} | P&L: ₹{final_pnl:,.0f} ({pnl_percent:+.1f}%)")
             
@@ -624,9 +618,9 @@ class PositionManager:
             print(f"❌ Error closing position {position['ticker']}: {e}")
             return {'action': 'error', 'reason': str(e)}
     
-    def _send_position_update(self, position, current_price, pnl, new_stop, trail_reason):
+    def _send_position_update(self, position, current_price, pnl, new_stop, trail_reason, uow):
         """
-        Send position update notification using existing schema
+        Queue position update notification using existing schema
         """
         try:
             ticker = position['ticker']
@@ -654,14 +648,14 @@ New Stop: Rs{new_stop:.2f}
 P&L: Rs{pnl:,.0f} ({pnl_percent:+.1f}%)
 Days: {(datetime.now() - datetime.fromisoformat(position['timestamp'].replace('Z', '+00:00'))).days}"""
             
-            send_telegram(message)
+            uow.notify(message, keys=[f"trade:{position['id']}"])
             
         except Exception as e:
             print(f"⚠️ Error sending position update: {e}")
     
-    def _send_closure_notification(self, position, exit_price, pnl, exit_reason, days_held):
+    def _send_closure_notification(self, position, exit_price, pnl, exit_reason, days_held, uow):
         """
-        Send position closure notification using existing schema
+        Queue position closure notification using existing schema
         """
         try:
             ticker = position['ticker']
@@ -695,7 +689,7 @@ Final P&L: Rs{pnl:,.0f} ({pnl_percent:+.1f}%)
 Held: {days_held} days
 Daily Return: {pnl_percent/max(days_held, 1):+.2f}%"""
             
-            send_telegram(message)
+            uow.notify(message, keys=[f"trade:{position['id']}"])
             
         except Exception as e:
             print(f"⚠️ Error sending closure notification: {e}")
@@ -1,5 +1,5 @@
-import yfinance as yf
 import pandas as pd
+from market_data import download
 import numpy as np
 from datetime import datetime, timedelta
 from indicators import calculate_rsi
@@ -20,7 +20,7 @@ class MarketRegimeDetector:
         """
         try:
             # Fetch Nifty 50 data
-            nifty_data = yf.download("^NSEI", period="3mo", interval="1d", progress=False)
+            nifty_data = download("^NSEI", period="3mo", interval="1d", progress=False)
             
             if nifty_data.empty or len(nifty_data) < 20:
                 print("⚠️ Insufficient Nifty data, using SIDEWAYS regime")
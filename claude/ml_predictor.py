@@ -1,11 +1,11 @@
 import pandas as pd
+from market_data import download
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.model_selection import TimeSeriesSplit, cross_val_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
-import yfinance as yf
 from datetime import datetime, timedelta
 import os
 from supabase import create_client
@@ -271,7 +271,7 @@ class MLPredictor:
                 return None, None
             
             # Get Nifty data for relative strength calculation
-            nifty_data = yf.download("^NSEI", period="1y", interval="1d", progress=False)
+            nifty_data = download("^NSEI", period="1y", interval="1d", progress=False)
             if isinstance(nifty_data.columns, pd.MultiIndex):
                 nifty_data.columns = nifty_data.columns.get_level_values(0)
             
@@ -287,7 +287,7 @@ class MLPredictor:
                     start_date = entry_date - timedelta(days=100)  # Get enough history
                     
                     # Download stock data
-                    stock_data = yf.download(
+                    stock_data = download(
                         trade['ticker'], 
                         start=start_date.strftime('%Y-%m-%d'),
                         end=(entry_date + timedelta(days=1)).strftime('%Y-%m-%d'),
@@ -646,8 +646,8 @@ if __name__ == "__main__":
     
     try:
         # Get test data
-        stock_data = yf.download(test_ticker, period="6mo", interval="1d", progress=False)
-        nifty_data = yf.download("^NSEI", period="6mo", interval="1d", progress=False)
+        stock_data = download(test_ticker, period="6mo", interval="1d", progress=False)
+        nifty_data = download("^NSEI", period="6mo", interval="1d", progress=False)
         
         if isinstance(stock_data.columns, pd.MultiIndex):
             stock_data.columns = stock_data.columns.get_level_values(0)
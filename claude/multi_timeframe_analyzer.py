@@ -1,5 +1,5 @@
-import yfinance as yf
 import pandas as pd
+from market_data import download
 import numpy as np
 from datetime import datetime, timedelta
 from indicators import calculate_additional_indicators, detect_candle_pattern, advanced_strategy_score
@@ -29,7 +29,7 @@ class MultiTimeframeAnalyzer:
             data = {}
             for tf_name, tf_config in self.timeframes.items():
                 try:
-                    df = yf.download(ticker, 
+                    df = download(ticker, 
                                    period=tf_config["period"], 
                                    interval=tf_config["interval"], 
                                    progress=False)
@@ -207,7 +207,7 @@ class MultiTimeframeAnalyzer:
         daily_analysis = analysis["daily"]
         
         # Start with daily analysis base score
-        daily_df = yf.download(ticker, period="3mo", interval="1d", progress=False)
+        daily_df = download(ticker, period="3mo", interval="1d", progress=False)
         if isinstance(daily_df.columns, pd.MultiIndex):
             daily_df.columns = daily_df.columns.get_level_values(0)
         daily_df.columns.name = None
@@ -344,7 +344,7 @@ class EntryOptimizer:
         """
         try:
             # Get recent intraday data
-            intraday_data = yf.download(ticker, period="2d", interval="5m", progress=False)
+            intraday_data = download(ticker, period="2d", interval="5m", progress=False)
             
             if intraday_data.empty:
                 return {
@@ -3,6 +3,7 @@ import numpy as np
 from datetime import datetime, timedelta
 from supabase import create_client
 from indicators import SUPABASE_URL, SUPABASE_KEY
+from position_book import position_book
 
 class RiskManager:
     """
@@ -160,11 +161,11 @@ class RiskManager:
     
     def _get_open_positions(self):
         """
-        Get current open positions from database
+        Get current open positions from the shared position book, including
+        BUYs still waiting in a unit of work or the write queue
         """
         try:
-            response = self.supabase.table("trades").select("*").eq("status", "open").execute()
-            return response.data
+            return position_book.open_positions() + position_book.pending_buys()
         except:
             return []
     
@@ -385,8 +386,8 @@ class PortfolioRiskMonitor:
         Get open positions with calculated values
         """
         try:
-            response = self.supabase.table("trades").select("*").eq("status", "open").execute()
-            positions = response.data
+            # Copies, so the derived values below stay out of the shared book
+            positions = [dict(pos) for pos in position_book.open_positions() + position_book.pending_buys()]
             
             # Calculate current values for each position
             for pos in positions:
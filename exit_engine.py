@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# Inputs are one row per open position with columns: id, ticker, entry, stop,
+# target_1..3, price, close, rsi, macd, signal, ema_20, ema_50, atr
+MAX_PRICE_VARIATION_PCT = 50
+DEFAULT_STOP_PCT = 0.97
+TRAIL_PERCENT = 0.02
+TRAIL_AFTER_PROFIT = 0.02
+
+
+def _column(frame, name):
+    if name in frame:
+        return pd.to_numeric(frame[name], errors="coerce").to_numpy(dtype=float)
+    return np.full(len(frame), np.nan)
+
+
+def _present(values):
+    # Mirrors `if target and ...`: missing and zero targets are ignored
+    return ~np.isnan(values) & (values != 0)
+
+
+def evaluate_strategy_exits(frame):
+    """
+    analyze_for_trading exit rules for every open position at once.
+    Returns one action dict per row:
+      skip   - no price, or price variation too large to trust
+      hold   - keep the position
+      extend - target 3 hit with momentum intact; fields to write
+      sell   - reason text for the exit
+    """
+    frame = pd.DataFrame(frame).reset_index(drop=True)
+    entry = _column(frame, 'entry')
+    price = _column(frame, 'price')
+    stop = _column(frame, 'stop')
+    stop = np.where(np.isnan(stop), entry * DEFAULT_STOP_PCT, stop)
+    t1, t2, t3 = (_column(frame, f'target_{n}') for n in (1, 2, 3))
+    close = _column(frame, 'close')
+    rsi = _column(frame, 'rsi')
+    macd = _column(frame, 'macd')
+    signal = _column(frame, 'signal')
+    ema_20 = _column(frame, 'ema_20')
+    ema_50 = _column(frame, 'ema_50')
+    atr = np.nan_to_num(_column(frame, 'atr'))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        no_price = np.isnan(price)
+        too_volatile = np.abs(price - entry) / entry * 100 > MAX_PRICE_VARIATION_PCT
+        skip = no_price | too_volatile
+
+        stop_hit = price <= stop
+        macd_weak = macd < signal
+        hit_3 = _present(t3) & (price >= t3)
+        hit_2 = ~hit_3 & _present(t2) & (price >= t2)
+        hit_1 = ~hit_3 & ~hit_2 & _present(t1) & (price >= t1)
+
+        exit_3 = hit_3 & ((rsi < 55) | macd_weak | (close < ema_20))
+        exit_2 = hit_2 & ((rsi < 55) | macd_weak)
+        exit_1 = hit_1 & ((rsi < 50) | macd_weak | (close < ema_50))
+
+        extend = ~skip & hit_3 & ~exit_3
+        strong_hold = (hit_2 & ~exit_2) | (hit_1 & ~exit_1)
+        sell_stop = stop_hit & ~extend & ~strong_hold
+
+    reasons = [
+        (sell_stop, "Hit Stop Loss"),
+        (exit_3, "Exiting after Target 3"),
+        (exit_2, "Exiting at Target 2 due to weakening"),
+        (exit_1, "Weakness at Target 1"),
+    ]
+    new_target_3 = np.round(price + 1.5 * atr, 2)
+    new_target_4 = np.round(price + 2.5 * atr, 2)
+
+    actions = []
+    for i in range(len(frame)):
+        action = {"id": frame.at[i, 'id'], "ticker": frame.at[i, 'ticker'], "price": price[i]}
+        if skip[i]:
+            action.update(action="skip", reason="no price" if no_price[i] else "price variation too high")
+        elif extend[i]:
+            action.update(
+                action="extend",
+                fields={"target_2": t3[i], "target_3": new_target_3[i]},
+                next_target=new_target_4[i]
+            )
+        else:
+            sell_reasons = [text for mask, text in reasons if mask[i]]
+            if sell_reasons:
+                action.update(action="sell", reason=", ".join(sell_reasons))
+            else:
+                action.update(action="hold")
+        actions.append(action)
+    return actions
+
+
+def evaluate_position_updates(frame, trail_percent=TRAIL_PERCENT):
+    """
+    PositionManager rules for every open position at once: close on stop or
+    the lowest target hit, otherwise trail the stop once 2% in profit.
+    Returns one action dict per row: skip / close (reason) / update (new_stop, trail_reason).
+    """
+    frame = pd.DataFrame(frame).reset_index(drop=True)
+    entry = _column(frame, 'entry')
+    price = _column(frame, 'price')
+    stop = _column(frame, 'stop')
+    stop = np.where(np.isnan(stop), entry * 0.95, stop)
+    targets = [_column(frame, f'target_{n}') for n in (1, 2, 3)]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        no_price = np.isnan(price)
+        stop_hit = ~no_price & (price <= stop)
+        target_hits = np.column_stack([_present(t) & (price >= t) for t in targets]) if len(frame) else np.zeros((0, 3), bool)
+        any_target = ~stop_hit & target_hits.any(axis=1)
+        first_target = target_hits.argmax(axis=1) + 1
+
+        profit = (price - entry) / entry
+        trailed = price * (1 - trail_percent)
+        in_loss = price <= entry
+        too_small = ~in_loss & (profit < TRAIL_AFTER_PROFIT)
+        moves_up = ~in_loss & ~too_small & (trailed > stop)
+
+    new_stop = np.where(moves_up, trailed, stop)
+    trail_reason = np.select(
+        [in_loss, too_small, moves_up], ["no_trail_loss", "profit_too_small", "stop_trailed"], "no_change"
+    )
+
+    actions = []
+    for i in range(len(frame)):
+        action = {"id": frame.at[i, 'id'], "ticker": frame.at[i, 'ticker'], "price": price[i]}
+        if no_price[i]:
+            action.update(action="skip", reason="Cannot get current price")
+        elif stop_hit[i]:
+            action.update(action="close", reason="stop_loss")
+        elif any_target[i]:
+            action.update(action="close", reason=f"target_{first_target[i]}")
+        else:
+            action.update(action="update", new_stop=float(new_stop[i]), trail_reason=str(trail_reason[i]))
+        actions.append(action)
+    return actions
@@ -1,8 +1,8 @@
 import pandas as pd
+from market_data import download
 import requests
 import joblib
 import os
-import yfinance as yf
 
 # === Strategy Thresholds ===
 RSI_THRESHOLD_MIN = 45
@@ -33,15 +33,17 @@ def load_ai_model():
         return None
 
 
+MODEL_FEATURE_COLUMNS = [
+    'Close', 'EMA_20', 'EMA_50',
+    'RSI', 'MACD', 'Signal',
+    'MACD_Hist', 'Volume', 'Volume_avg',
+    'ATR', 'BB_Position',
+    'Price_Change_1D', 'Price_Change_3D', 'Price_Change_5D',
+    'Stoch_K', 'Stoch_D', 'WilliamsR'
+]
+
 def extract_features_for_model(latest):
-    return [
-        latest['Close'], latest['EMA_20'], latest['EMA_50'],
-        latest['RSI'], latest['MACD'], latest['Signal'],
-        latest['MACD_Hist'], latest['Volume'], latest['Volume_avg'],
-        latest['ATR'], latest['BB_Position'],
-        latest['Price_Change_1D'], latest['Price_Change_3D'], latest['Price_Change_5D'],
-        latest['Stoch_K'], latest['Stoch_D'], latest['WilliamsR']
-    ]
+    return [latest[col] for col in MODEL_FEATURE_COLUMNS]
 
 def send_telegram(message):
     try:
@@ -53,8 +55,10 @@ def send_telegram(message):
         }
         response = requests.post(url, json=payload)
         print("📬 Telegram alert sent." if response.status_code == 200 else "❌ Telegram failed:", response.text)
+        return response.status_code == 200
     except Exception as e:
         print("⚠️ Telegram error:", e)
+        return False
 
 def calculate_rsi(series, period=14):
     delta = series.diff()
@@ -182,7 +186,7 @@ def safe_adx(df, window=14):
 
 def detect_intraday_spike(ticker):
     try:
-        df_5min = yf.download(ticker, interval="5m", period="1d", progress=False)
+        df_5min = download(ticker, interval="5m", period="1d", progress=False)
         df_5min = df_5min[['Close']].dropna()
         df_5min['change'] = df_5min['Close'].pct_change() * 100
         recent_spike = df_5min['change'].tail(6).sum() > 3  # 6x5min = 30min
@@ -190,34 +194,37 @@ def detect_intraday_spike(ticker):
     except:
         return False
 
-def ai_strategy_score(latest, previous, df_weekly=None, df_full=None, ticker=None, market_regime="NEUTRAL"):
-    regime_multipliers = {
-        "BULL_STRONG": 1.2,
-        "BULL_WEAK": 1.1,
-        "NEUTRAL": 1.0,
-        "BEAR_WEAK": 0.8,
-        "BEAR_STRONG": 0.6
-    }
+# === ai_strategy_score weights ===
+STRATEGY_WEIGHTS = {
+    "price_trend": 1.0,
+    "ema_trend": 0.6,
+    "rsi": 0.9,
+    "macd": 1.0,
+    "volume": 0.7,
+    "stoch": 0.5,
+    "willr": 0.5,
+    "pattern": 0.4,
+    "bb_position": 0.3,
+    "price_momentum": 0.5,
+    "weekly_confirmation": 1.2,
+    "ml_prediction": 1.5
+}
+
+REGIME_MULTIPLIERS = {
+    "BULL_STRONG": 1.2,
+    "BULL_WEAK": 1.1,
+    "NEUTRAL": 1.0,
+    "BEAR_WEAK": 0.8,
+    "BEAR_STRONG": 0.6
+}
 
-    regime_multiplier = regime_multipliers.get(market_regime, 1.0)
+def ai_strategy_score(latest, previous, df_weekly=None, df_full=None, ticker=None, market_regime="NEUTRAL"):
+    regime_multiplier = REGIME_MULTIPLIERS.get(market_regime, 1.0)
     score = 0.0
     matched = []
     reasoning = []
 
-    weights = {
-        "price_trend": 1.0,
-        "ema_trend": 0.6,
-        "rsi": 0.9,
-        "macd": 1.0,
-        "volume": 0.7,
-        "stoch": 0.5,
-        "willr": 0.5,
-        "pattern": 0.4,
-        "bb_position": 0.3,
-        "price_momentum": 0.5,
-        "weekly_confirmation": 1.2,
-        "ml_prediction": 1.5
-    }
+    weights = STRATEGY_WEIGHTS
 
     if latest['Close'] > latest['EMA_20'] > latest['EMA_50']:
         score += weights["price_trend"]
@@ -0,0 +1,161 @@
+import threading
+import traceback
+import uuid
+from datetime import datetime
+
+JOB_HISTORY_LIMIT = 50
+
+
+class JobAlreadyRunning(Exception):
+    def __init__(self, job):
+        super().__init__(f"{job.job_type} job {job.id} is already running")
+        self.job = job
+
+
+class Job:
+    """
+    Progress and cancellation handle for one background run.
+    Runners call set_total / tick and stop early once cancelled is set.
+    """
+    def __init__(self, job_type):
+        self.id = uuid.uuid4().hex[:12]
+        self.job_type = job_type
+        self.status = "queued"
+        self.total = 0
+        self.processed = 0
+        self.qualified = 0
+        self.errors = 0
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def set_processed(self, processed):
+        """For runners that know their absolute progress rather than increments"""
+        with self._lock:
+            self.processed = processed
+
+    def tick(self, count=1, qualified=0, errors=0):
+        with self._lock:
+            self.processed += count
+            self.qualified += qualified
+            self.errors += errors
+
+    def eta_seconds(self):
+        if not self.started_at or not self.processed or not self.total or self.finished_at:
+            return None
+        elapsed = (datetime.utcnow() - self.started_at).total_seconds()
+        remaining = max(self.total - self.processed, 0)
+        return round(elapsed / self.processed * remaining, 1)
+
+    def is_active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "job_type": self.job_type,
+                "status": self.status,
+                "total": self.total,
+                "processed": self.processed,
+                "qualified": self.qualified,
+                "errors": self.errors,
+                "progress_pct": round(self.processed / self.total * 100, 1) if self.total else 0,
+                "eta_sec": self.eta_seconds(),
+                "cancel_requested": self.cancelled,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "result": self.result,
+                "error": self.error
+            }
+
+
+class JobManager:
+    """
+    Runs screening / trading jobs on background threads, one active job per type
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = {}
+
+    def start(self, job_type, target, *args, **kwargs):
+        """
+        Start target(*args, job=job, **kwargs) in the background.
+        Raises JobAlreadyRunning if a job of the same type is still active.
+        """
+        with self._lock:
+            active_id = self._active.get(job_type)
+            if active_id and self._jobs[active_id].is_active():
+                raise JobAlreadyRunning(self._jobs[active_id])
+
+            job = Job(job_type)
+            self._jobs[job.id] = job
+            self._active[job_type] = job.id
+            self._trim_history()
+
+        thread = threading.Thread(
+            target=self._run, args=(job, target, args, kwargs),
+            name=f"job-{job_type}-{job.id}", daemon=True
+        )
+        thread.start()
+        print(f"🧵 Started {job_type} job {job.id}")
+        return job
+
+    def _run(self, job, target, args, kwargs):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            job.result = target(*args, job=job, **kwargs)
+            job.status = "cancelled" if job.cancelled else "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ {job.job_type} job {job.id} failed: {e}")
+            traceback.print_exc()
+        finally:
+            job.finished_at = datetime.utcnow()
+            print(f"🏁 {job.job_type} job {job.id} {job.status} ({job.processed}/{job.total})")
+
+    def _trim_history(self):
+        finished = [j for j in self._jobs.values() if not j.is_active()]
+        finished.sort(key=lambda j: j.created_at)
+        for job in finished[:max(0, len(self._jobs) - JOB_HISTORY_LIMIT)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def active(self, job_type):
+        job = self._jobs.get(self._active.get(job_type))
+        return job if job and job.is_active() else None
+
+    def list(self):
+        jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job and job.is_active():
+            job.cancel()
+            print(f"🛑 Cancellation requested for {job.job_type} job {job.id}")
+        return job
+
+
+job_manager = JobManager()
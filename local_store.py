@@ -0,0 +1,22 @@
+import os
+import sqlite3
+
+# Local on-disk state (caches, checkpoints, queues); lost on a fresh Render instance
+CACHE_DIR = os.getenv("BOT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def cache_path(filename):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, filename)
+
+
+def connect(db_name):
+    """
+    Open a SQLite database in CACHE_DIR (or at an absolute path) that can be
+    shared between threads and processes
+    """
+    path = db_name if os.path.isabs(db_name) else cache_path(db_name)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
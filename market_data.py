@@ -0,0 +1,79 @@
+import threading
+import yfinance as yf
+import pandas as pd
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DOWNLOAD_CHUNK_SIZE = 100
+
+# yf.download collects its results in module globals (shared._DFS / _ERRORS),
+# so two concurrent calls can return each other's frames
+_DOWNLOAD_LOCK = threading.Lock()
+
+
+def download(*args, **kwargs):
+    """
+    yf.download, one call at a time across the process
+    """
+    with _DOWNLOAD_LOCK:
+        return yf.download(*args, **kwargs)
+
+
+def clean_ohlcv(df):
+    """
+    Flatten yfinance columns and keep clean float OHLCV rows
+    """
+    if df is None or df.empty:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df.columns.name = None
+    missing = [col for col in OHLCV_COLUMNS if col not in df.columns]
+    if missing:
+        return pd.DataFrame(columns=OHLCV_COLUMNS)
+    return df[OHLCV_COLUMNS].dropna().astype(float)
+
+
+def fetch_ohlcv(ticker, period="6mo", interval="1d"):
+    """
+    Download a single ticker's OHLCV history
+    """
+    df = download(ticker, period=period, interval=interval, progress=False)
+    return clean_ohlcv(df)
+
+
+def fetch_ohlcv_batch(tickers, period="6mo", interval="1d", chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """
+    Download OHLCV history for many tickers with one yfinance call per chunk.
+    Returns {ticker: DataFrame}; tickers without data are left out.
+    """
+    frames = {}
+    tickers = list(tickers)
+
+    for start in range(0, len(tickers), chunk_size):
+        chunk = tickers[start:start + chunk_size]
+        try:
+            raw = download(
+                chunk, period=period, interval=interval,
+                group_by="ticker", progress=False, threads=True
+            )
+        except Exception as e:
+            print(f"⚠️ Batch download failed for {len(chunk)} tickers: {e}")
+            continue
+
+        if raw is None or raw.empty:
+            continue
+
+        for ticker in chunk:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if ticker not in raw.columns.get_level_values(0):
+                    continue
+                df = clean_ohlcv(raw[ticker])
+            else:
+                df = clean_ohlcv(raw)
+            if not df.empty:
+                frames[ticker] = df
+
+        print(f"📥 Downloaded {min(start + chunk_size, len(tickers))}/{len(tickers)} tickers")
+
+    return frames
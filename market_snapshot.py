@@ -0,0 +1,134 @@
+import json
+import os
+import pickle
+import threading
+from datetime import datetime, timedelta
+import pytz
+from local_store import connect
+from trading_calendar import last_final
+
+SNAPSHOT_DB = "market_snapshot.db"
+SNAPSHOT_PERIOD = "6mo"  # Daily history the screener downloads (and snapshots) per ticker
+# The screener runs at :15 and trading at :45, so one hour covers the next trading run
+SNAPSHOT_MAX_AGE_MINUTES = int(os.getenv("SNAPSHOT_MAX_AGE_MINUTES", "60"))
+
+
+def _final_cutoff():
+    """
+    When the latest session's bars became final, as naive UTC (written_at's
+    format); None while the market is open or its close is still settling
+    """
+    final = last_final()
+    return final.astimezone(pytz.utc).replace(tzinfo=None) if final else None
+
+
+class MarketSnapshot:
+    """
+    Latest daily OHLCV and screener record per ticker, stamped with the bar
+    time and write time, so trading can reuse the screener's downloads
+    """
+    def __init__(self, db_name=SNAPSHOT_DB, max_age_minutes=SNAPSHOT_MAX_AGE_MINUTES):
+        self.max_age = timedelta(minutes=max_age_minutes)
+        self._lock = threading.Lock()
+        self.conn = connect(db_name)
+        self.conn.execute("""
+            create table if not exists market_snapshot (
+                ticker text primary key,
+                bar_ts text,
+                ohlcv blob,
+                score real,
+                record_json text,
+                written_at text not null
+            )
+        """)
+        self.conn.commit()
+
+    def store_frames(self, frames):
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (ticker, str(df.index[-1]), pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL), now)
+            for ticker, df in frames.items() if df is not None and not df.empty
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "insert or replace into market_snapshot (ticker, bar_ts, ohlcv, written_at) values (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def store_records(self, records):
+        """
+        records: iterable of (ticker, screener record)
+        """
+        rows = [
+            (record["result"]["score"] if record and record.get("result") else None,
+             json.dumps(record, default=str) if record else None,
+             ticker)
+            for ticker, record in records
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "update market_snapshot set score = ?, record_json = ? where ticker = ?", rows
+            )
+            self.conn.commit()
+
+    def load_fresh(self, tickers):
+        """
+        {ticker: OHLCV frame} for tickers whose snapshot is younger than max_age,
+        or was taken once the last session's bars were final
+        """
+        cutoff = datetime.utcnow() - self.max_age
+        final_cutoff = _final_cutoff()
+        if final_cutoff:
+            cutoff = min(cutoff, final_cutoff)
+        return self._load_since(tickers, cutoff)
+
+    def load_final(self, tickers):
+        """
+        {ticker: OHLCV frame} that cannot change before the next session:
+        empty from the open until the close has settled
+        """
+        final_cutoff = _final_cutoff()
+        return self._load_since(tickers, final_cutoff) if final_cutoff else {}
+
+    def _load_since(self, tickers, cutoff):
+        tickers = list(tickers)
+        cutoff = cutoff.isoformat()
+        frames = {}
+        with self._lock:
+            for start in range(0, len(tickers), 500):
+                chunk = tickers[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"select ticker, ohlcv from market_snapshot "
+                    f"where written_at >= ? and ticker in ({placeholders})",
+                    [cutoff, *chunk]
+                ).fetchall()
+                frames.update({row["ticker"]: pickle.loads(row["ohlcv"]) for row in rows})
+        return frames
+
+
+class MarketSnapshotSink:
+    """
+    ScreeningEngine sink that writes every downloaded frame and its record to the snapshot
+    """
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot or MarketSnapshot()
+        self._records = []
+
+    def on_frames(self, frames):
+        self._flush()
+        count = self.snapshot.store_frames(frames)
+        print(f"📸 Market snapshot: {count} tickers written")
+
+    def on_result(self, ticker, record, qualified):
+        self._records.append((ticker, record))
+
+    def on_complete(self, matches, stats):
+        self._flush()
+
+    def _flush(self):
+        if self._records:
+            self.snapshot.store_records(self._records)
+            self._records = []
@@ -0,0 +1,88 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from market_data import fetch_ohlcv_batch
+
+# 1 keeps the serial path, 0 means one worker per CPU core
+SCREENER_WORKERS = int(os.getenv("SCREENER_WORKERS", "1"))
+SHARDS_PER_WORKER = 4
+
+
+def resolve_workers(workers=None):
+    if workers is None:
+        workers = SCREENER_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def _run_shard(args):
+    """
+    Worker entry point: score a shard of pre-fetched (ticker, OHLCV) pairs
+    """
+    worker_fn, shard, context = args
+    records = []
+    for ticker, df in shard:
+        try:
+            if context is None:
+                records.append(worker_fn(ticker, df))
+            else:
+                records.append(worker_fn(ticker, df, context))
+        except Exception as e:
+            print(f"❌ Worker error for {ticker}: {e}")
+            records.append(None)
+    return records
+
+
+def run_sharded(worker_fn, tickers, period="6mo", workers=None, context=None, frames=None, job=None,
+                on_shard=None):
+    """
+    Pre-fetch OHLCV for the universe, shard it across a process pool and run
+    worker_fn(ticker, df[, context]) on every ticker.
+    Returns [(ticker, record)] in the same order as tickers; when job is
+    cancelled, shards that have not started are dropped.
+    on_shard([(ticker, record)]) is called as each shard completes.
+    """
+    tickers = list(tickers)
+    if frames is None:
+        frames = fetch_ohlcv_batch(tickers, period=period)
+    items = [(ticker, frames.get(ticker)) for ticker in tickers]
+    if not items:
+        return []
+
+    workers = resolve_workers(workers)
+    shard_size = max(1, math.ceil(len(items) / (workers * SHARDS_PER_WORKER)))
+    shards = [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+    shard_jobs = [(worker_fn, shard, context) for shard in shards]
+
+    print(f"⚙️ Screening {len(items)} tickers in {len(shards)} shards on {workers} worker(s)")
+    shard_records = [None] * len(shards)
+
+    def _done(index, records):
+        shard_records[index] = records
+        if job:
+            job.tick(len(records))
+        if on_shard:
+            on_shard([(ticker, record) for (ticker, _), record in zip(shards[index], records)])
+
+    if workers == 1:
+        for index, shard_job in enumerate(shard_jobs):
+            if job and job.cancelled:
+                break
+            _done(index, _run_shard(shard_job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = {pool.submit(_run_shard, shard_job): index for index, shard_job in enumerate(shard_jobs)}
+            for future in as_completed(futures):
+                _done(futures[future], future.result())
+                if job and job.cancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+    return [
+        (ticker, record)
+        for shard, records in zip(shards, shard_records) if records is not None
+        for (ticker, _), record in zip(shard, records)
+    ]
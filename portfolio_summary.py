@@ -0,0 +1,57 @@
+import argparse
+from supabase import create_client, Client
+from indicators import SUPABASE_URL, SUPABASE_KEY
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+def totals_from_summary(row):
+    """portfolio_summary row as trade_position_totals-shaped rows"""
+    return [
+        {
+            "position_status": "OPEN",
+            "trades": row["open_trades"],
+            "total_invested": row["open_invested"],
+            "exit_value": 0,
+            "winning_trades": 0
+        },
+        {
+            "position_status": "CLOSED",
+            "trades": row["closed_trades"],
+            "total_invested": row["closed_invested"],
+            "exit_value": row["closed_exit_value"],
+            "winning_trades": row["winning_trades"]
+        }
+    ]
+
+
+def load_portfolio_totals():
+    """
+    Totals from the single trigger-maintained portfolio_summary row;
+    falls back to aggregating the trade_position_totals view
+    """
+    try:
+        rows = supabase.table("portfolio_summary").select("*").eq("id", 1).execute().data
+        if rows:
+            return totals_from_summary(rows[0])
+    except Exception as e:
+        print(f"⚠️ portfolio_summary unavailable, aggregating trade_position_totals: {e}")
+    return supabase.table("trade_position_totals").select("*").execute().data
+
+
+def rebuild_portfolio_summary(job=None):
+    """Recompute portfolio_summary from the whole trades table (repair after drift or manual edits)"""
+    rows = supabase.rpc("rebuild_portfolio_summary").execute().data
+    summary = rows[0] if rows else None
+    print(f"🧮 Portfolio summary rebuilt: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Portfolio summary maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the summary from the trades table")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_portfolio_summary()
+    else:
+        print(load_portfolio_totals())
@@ -0,0 +1,114 @@
+import threading
+import time
+from supabase import create_client, Client
+from indicators import SUPABASE_URL, SUPABASE_KEY
+
+# Re-read from Supabase after this long to pick up trades written by other processes
+POSITION_BOOK_TTL = 300
+
+
+class PositionBook:
+    """
+    Open positions loaded once, indexed by id and ticker, and updated in
+    place on every buy / update / sell the bot performs
+    """
+    def __init__(self, ttl_seconds=POSITION_BOOK_TTL):
+        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.ttl = ttl_seconds
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_ticker = {}
+        self._pending_buys = {}  # ticker -> BUY rows buffered or queued for a later write
+        self._loaded_at = None
+
+    def load(self, force=False):
+        with self._lock:
+            if not force and self._loaded_at and time.time() - self._loaded_at < self.ttl:
+                return
+            # Status is written as both 'OPEN' and 'open'
+            response = self.supabase.table("trades").select("*").ilike("status", "open").execute()
+            self._by_id = {}
+            self._by_ticker = {}
+            for trade in response.data:
+                self._index(trade)
+            self._loaded_at = time.time()
+            print(f"📚 Position book loaded: {len(self._by_id)} open positions")
+
+    def _index(self, trade):
+        self._by_id[trade["id"]] = trade
+        self._by_ticker.setdefault(trade["ticker"], {})[trade["id"]] = trade
+
+    def _unindex(self, trade_id):
+        trade = self._by_id.pop(trade_id, None)
+        if trade:
+            positions = self._by_ticker.get(trade["ticker"], {})
+            positions.pop(trade_id, None)
+            if not positions:
+                self._by_ticker.pop(trade["ticker"], None)
+        return trade
+
+    def open_positions(self):
+        with self._lock:
+            self.load()
+            return list(self._by_id.values())
+
+    def positions_for(self, ticker):
+        with self._lock:
+            self.load()
+            return list(self._by_ticker.get(ticker, {}).values())
+
+    def has_pending_buy(self, ticker):
+        with self._lock:
+            return bool(self._pending_buys.get(ticker))
+
+    def pending_buys(self):
+        """BUY rows reserved but not yet written, for limits that count positions"""
+        with self._lock:
+            return [trade for trades in self._pending_buys.values() for trade in trades]
+
+    def has_open_position(self, ticker):
+        """Open in the book, or bought and not yet written"""
+        return self.has_pending_buy(ticker) or bool(self.positions_for(ticker))
+
+    def get(self, trade_id):
+        with self._lock:
+            self.load()
+            return self._by_id.get(trade_id)
+
+    def record_buy(self, trade):
+        """Add a freshly inserted trade row"""
+        with self._lock:
+            if trade and str(trade.get("status", "")).upper() == "OPEN":
+                self._index(trade)
+
+    def reserve_buy(self, ticker, trade=None):
+        """A BUY buffered in a unit of work or the write queue; counts as open until released"""
+        with self._lock:
+            self._pending_buys.setdefault(ticker, []).append(trade or {"ticker": ticker})
+
+    def release_buy(self, ticker):
+        """The oldest reserved BUY of ticker has been written, handed over or given up"""
+        with self._lock:
+            trades = self._pending_buys.get(ticker)
+            if trades:
+                trades.pop(0)
+            if not trades:
+                self._pending_buys.pop(ticker, None)
+
+    def record_update(self, trade_id, fields):
+        """Apply an update written to the trades table; closed trades leave the book"""
+        with self._lock:
+            trade = self._by_id.get(trade_id)
+            if trade is None:
+                return
+            if str(fields.get("status", trade.get("status", ""))).upper() != "OPEN":
+                self._unindex(trade_id)
+            else:
+                trade.update(fields)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+position_book = PositionBook()
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+import pandas as pd
+from market_data import download
+from trading_calendar import IST, unchanged_since
+
+QUOTE_TTL_SECONDS = float(os.getenv("QUOTE_TTL_SECONDS", "5"))
+QUOTE_CHUNK_SIZE = 100
+
+
+def _last_closes(tickers, period, interval):
+    """
+    {ticker: (last close, bar timestamp)} from one batched yfinance call
+    """
+    raw = download(
+        list(tickers), period=period, interval=interval,
+        group_by="ticker", progress=False, threads=True
+    )
+    quotes = {}
+    if raw is None or raw.empty:
+        return quotes
+
+    for ticker in tickers:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if ticker not in raw.columns.get_level_values(0):
+                continue
+            closes = raw[ticker]["Close"].dropna()
+        else:
+            closes = raw["Close"].dropna()
+        if not closes.empty:
+            stamp = closes.index[-1]
+            # Daily bars come back naive (exchange-local); keep every quoted_at comparable
+            stamp = stamp.tz_localize(IST) if stamp.tzinfo is None else stamp.tz_convert(IST)
+            quotes[ticker] = (float(closes.iloc[-1]), stamp.isoformat())
+    return quotes
+
+
+class QuoteService:
+    """
+    Last prices for many tickers in one batched download, cached for a few seconds
+    """
+    def __init__(self, ttl_seconds=QUOTE_TTL_SECONDS):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._quotes = {}  # ticker -> (price, quoted_at, fetched_at)
+
+    def get_quote_records(self, tickers):
+        """
+        {ticker: {"price": float, "quoted_at": bar timestamp}} for tickers with a quote
+        """
+        tickers = list(dict.fromkeys(tickers))
+        now = time.time()
+        # While the market is shut, a quote fetched once the close settled stays current
+        with self._lock:
+            missing = [
+                t for t in tickers
+                if t not in self._quotes or (
+                    now - self._quotes[t][2] >= self.ttl
+                    and not unchanged_since(self._quotes[t][2])
+                )
+            ]
+
+        for start in range(0, len(missing), QUOTE_CHUNK_SIZE):
+            chunk = missing[start:start + QUOTE_CHUNK_SIZE]
+            try:
+                fetched = _last_closes(chunk, period="1d", interval="1m")
+                stale = [t for t in chunk if t not in fetched]
+                if stale:
+                    # No intraday bars (e.g. before the open): use the last daily close
+                    fetched.update(_last_closes(stale, period="5d", interval="1d"))
+            except Exception as e:
+                print(f"⚠️ Quote download failed for {len(chunk)} tickers: {e}")
+                continue
+            fetched_at = time.time()
+            with self._lock:
+                for ticker, (price, quoted_at) in fetched.items():
+                    self._quotes[ticker] = (price, quoted_at, fetched_at)
+
+        with self._lock:
+            return {
+                t: {"price": self._quotes[t][0], "quoted_at": self._quotes[t][1]}
+                for t in tickers if t in self._quotes
+            }
+
+    def get_quotes(self, tickers):
+        return {t: quote["price"] for t, quote in self.get_quote_records(tickers).items()}
+
+    def get_quote(self, ticker):
+        return self.get_quotes([ticker]).get(ticker)
+
+
+quote_service = QuoteService()
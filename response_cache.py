@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process TTL cache for expensive endpoint payloads. Fresh entries are
+    served as-is; expired entries are served stale while one background
+    refresh runs. Only the very first request for a key computes inline.
+    """
+    def __init__(self, ttl_seconds):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}      # key -> (value, stored_at)
+        self._key_locks = {}
+        self._refreshing = set()
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key, compute):
+        """
+        Returns (value, "fresh" | "stale" | "miss")
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            return self._compute(key, compute, since=None), "miss"
+
+        value, stored_at = entry
+        if time.time() - stored_at < self.ttl:
+            return value, "fresh"
+
+        self._refresh_in_background(key, compute)
+        return value, "stale"
+
+    def _compute(self, key, compute, since):
+        # Single flight: callers queue on the key lock and reuse a result
+        # stored while they waited
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and (since is None or entry[1] > since):
+                return entry[0]
+
+            value = compute()
+            with self._lock:
+                self._entries[key] = (value, time.time())
+            return value
+
+    def _refresh_in_background(self, key, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            since = self._entries[key][1]
+
+        def _run():
+            try:
+                self._compute(key, compute, since=since)
+            except Exception as e:
+                print(f"⚠️ Background refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=_run, name=f"refresh-{key}", daemon=True).start()
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stored_at(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry else None
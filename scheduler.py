@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from jobs import job_manager, JobAlreadyRunning
+from local_store import connect
+from trading_calendar import IST, now_ist
+
+SCHEDULER_DB = os.getenv("SCHEDULER_DB", "scheduler.db")
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+POLL_SECONDS = 20
+DEFAULT_JITTER_SECONDS = 60
+DEFAULT_CATCH_UP_MINUTES = 30   # A slot missed by more than this is skipped, not run late
+WEEKDAYS = (0, 1, 2, 3, 4)
+LOOKBACK_DAYS = 7
+
+
+def every(minutes, start="09:15", end="15:30"):
+    """["HH:MM", ...] every `minutes` from start to end inclusive"""
+    h, m = map(int, start.split(":"))
+    eh, em = map(int, end.split(":"))
+    times, current = [], h * 60 + m
+    while current <= eh * 60 + em:
+        times.append(f"{current // 60:02d}:{current % 60:02d}")
+        current += minutes
+    return times
+
+
+class ScheduledJob:
+    """
+    A target run at fixed IST times on the given weekdays.
+    Background jobs go through job_manager (one active run per job_type);
+    the rest run inline on the scheduler thread and must be quick.
+    """
+    def __init__(self, name, target, times, days=WEEKDAYS, kwargs=None, background=True,
+                 jitter_seconds=DEFAULT_JITTER_SECONDS, catch_up_minutes=DEFAULT_CATCH_UP_MINUTES):
+        self.name = name
+        self.target = target
+        self.times = sorted(tuple(map(int, t.split(":"))) for t in times)
+        self.days = set(days)
+        self.kwargs = kwargs or {}
+        self.background = background
+        self.jitter_seconds = jitter_seconds
+        self.catch_up = timedelta(minutes=catch_up_minutes)
+
+    def slots_on(self, day):
+        if day.weekday() not in self.days:
+            return []
+        return [IST.localize(datetime(day.year, day.month, day.day, h, m)) for h, m in self.times]
+
+    def latest_slot(self, now):
+        """Most recent scheduled time at or before now"""
+        for offset in range(LOOKBACK_DAYS + 1):
+            slots = [s for s in self.slots_on((now - timedelta(days=offset)).date()) if s <= now]
+            if slots:
+                return slots[-1]
+        return None
+
+    def next_slot(self, now):
+        for offset in range(LOOKBACK_DAYS + 1):
+            slots = [s for s in self.slots_on((now + timedelta(days=offset)).date()) if s > now]
+            if slots:
+                return slots[0]
+        return None
+
+
+class MarketScheduler:
+    """
+    In-process scheduler for the market-hours jobs. Each poll fires a job's
+    latest slot once its jitter has passed. Slots missed while the process
+    was down are run late if still within catch_up, otherwise recorded as
+    missed; several missed slots collapse into one run. A slot whose job is
+    still running from an earlier slot is skipped. The last handled slot per
+    job is kept in SQLite so a restart does not repeat it.
+    """
+    def __init__(self, jobs, db_name=SCHEDULER_DB, should_run=None):
+        self.jobs = {job.name: job for job in jobs}
+        self.should_run = should_run  # Optional (job, slot) -> bool, e.g. a trading-calendar check
+        self.conn = connect(db_name)
+        self.conn.execute("""
+            create table if not exists scheduler_state (
+                name text primary key,
+                last_slot text,
+                last_status text,
+                last_job_id text,
+                updated_at text
+            )
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._jitter = {}  # (name, slot) -> seconds
+        self._state = {
+            row["name"]: dict(row)
+            for row in self.conn.execute("select * from scheduler_state").fetchall()
+        }
+
+    def _record(self, job, slot, status, job_id=None):
+        state = {
+            "name": job.name,
+            "last_slot": slot.isoformat(),
+            "last_status": status,
+            "last_job_id": job_id,
+            "updated_at": now_ist().isoformat()
+        }
+        with self._lock, self.conn:
+            self._state[job.name] = state
+            self.conn.execute(
+                "insert or replace into scheduler_state (name, last_slot, last_status, last_job_id, updated_at) "
+                "values (:name, :last_slot, :last_status, :last_job_id, :updated_at)",
+                state
+            )
+        print(f"🗓️ {job.name} @ {slot.strftime('%a %H:%M')} IST: {status}")
+
+    def _handled(self, job, slot):
+        state = self._state.get(job.name)
+        return bool(state and state["last_slot"] and datetime.fromisoformat(state["last_slot"]) >= slot)
+
+    def _fire(self, job, slot):
+        if self.should_run and not self.should_run(job, slot):
+            self._record(job, slot, "skipped_closed")
+            return
+        if not job.background:
+            try:
+                job.target(**job.kwargs)
+                self._record(job, slot, "completed")
+            except Exception as e:
+                self._record(job, slot, f"failed: {e}")
+            return
+        try:
+            started = job_manager.start(job.name, job.target, **job.kwargs)
+        except JobAlreadyRunning as e:
+            self._record(job, slot, "skipped_overlap", e.job.id)
+            return
+        self._record(job, slot, "started", started.id)
+
+    def tick(self, now=None):
+        now = now or now_ist()
+        for job in self.jobs.values():
+            slot = job.latest_slot(now)
+            if slot is None or self._handled(job, slot):
+                continue
+            if now - slot > job.catch_up:
+                self._record(job, slot, "missed")
+                continue
+            jitter = self._jitter.setdefault((job.name, slot), random.uniform(0, job.jitter_seconds))
+            if now >= slot + timedelta(seconds=jitter):
+                self._jitter.pop((job.name, slot), None)
+                self._fire(job, slot)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Scheduler tick failed: {e}")
+            self._stop.wait(POLL_SECONDS)
+
+    def start(self):
+        if not SCHEDULER_ENABLED:
+            print("🗓️ Scheduler disabled (SCHEDULER_ENABLED=0)")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="market-scheduler", daemon=True)
+        self._thread.start()
+        print(f"🗓️ Scheduler started with {len(self.jobs)} jobs")
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        now = now_ist()
+        with self._lock:
+            state = {name: dict(s) for name, s in self._state.items()}
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "now": now.isoformat(),
+            "jobs": [
+                {
+                    "name": job.name,
+                    "times": [f"{h:02d}:{m:02d}" for h, m in job.times],
+                    "next_run": job.next_slot(now).isoformat() if job.next_slot(now) else None,
+                    "active_job_id": getattr(job_manager.active(job.name), "id", None) if job.background else None,
+                    **{k: v for k, v in state.get(job.name, {}).items() if k != "name"}
+                }
+                for job in self.jobs.values()
+            ]
+        }
@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+from supabase import create_client, Client
+from indicators import (
+    calculate_additional_indicators,
+    load_ai_model,
+    MODEL_FEATURE_COLUMNS,
+    STRATEGY_WEIGHTS,
+    REGIME_MULTIPLIERS,
+    RSI_THRESHOLD_MIN,
+    RSI_THRESHOLD_MAX,
+    STOCH_K_MAX,
+    WILLR_MAX,
+    SUPABASE_URL,
+    SUPABASE_KEY
+)
+from market_data import fetch_ohlcv_batch
+
+# Initialize Supabase client
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+SCORE_HISTORY_TABLE = "score_history"
+UPSERT_CHUNK_SIZE = 500
+
+# Bit position of every ai_strategy_score rule in matched_mask (order is part of the stored format)
+SCORE_RULES = [
+    "price", "ema_trend", "rsi", "macd", "volume", "stoch",
+    "willr", "pattern", "bb_pos", "momentum", "weekly", "ml"
+]
+RULE_BITS = {rule: 1 << i for i, rule in enumerate(SCORE_RULES)}
+
+
+def encode_matched_rules(matched):
+    mask = 0
+    for rule in matched:
+        mask |= RULE_BITS.get(rule, 0)
+    return mask
+
+
+def decode_matched_mask(mask):
+    return [rule for rule in SCORE_RULES if int(mask) & RULE_BITS[rule]]
+
+
+def _candle_flags(df):
+    """
+    Vectorized Hammer / Engulfing detection, same rules as detect_candle_pattern
+    """
+    o, h, l, c = df['Open'], df['High'], df['Low'], df['Close']
+    body = (c - o).abs()
+    lower_wick = np.where(c > o, o - l, c - l)
+    upper_wick = h - np.maximum(o, c)
+    hammer = (lower_wick > 2 * body) & (upper_wick < body)
+
+    prev_o, prev_c = o.shift(1), c.shift(1)
+    engulfing = (prev_c < prev_o) & (c > o) & (c > prev_o) & (o < prev_c)
+    return (hammer | engulfing).to_numpy()
+
+
+def _ewm_step(previous, value, span):
+    alpha = 2.0 / (span + 1)
+    return ((1.0 - alpha) * previous + alpha * value) / ((1.0 - alpha) + alpha)
+
+
+def _weekly_confirmation(df):
+    """
+    Weekly uptrend flag for every daily bar, as analyze_stock would see it on that day:
+    completed weeks before the bar plus a partial week that ends at the bar's close.
+    """
+    weekly_close = df['Close'].resample('W').last().dropna()
+    close = df['Close'].to_numpy()
+    if weekly_close.empty:
+        return np.zeros(len(df), dtype=bool)
+
+    week_pos = weekly_close.index.searchsorted(df.index.normalize())
+    has_prev = week_pos > 0
+    prev_idx = np.where(has_prev, week_pos - 1, 0)
+    weeks_seen = week_pos + 1
+
+    prev_close_w = np.where(has_prev, weekly_close.to_numpy()[prev_idx], np.nan)
+
+    emas = {}
+    for span in (20, 50):
+        raw = weekly_close.ewm(span=span, adjust=False).mean().to_numpy()
+        ema = np.where(has_prev, _ewm_step(raw[prev_idx], close, span), close)
+        emas[span] = np.where(weeks_seen >= span, ema, np.nan)
+
+    return (
+        (weeks_seen > 3) &
+        (close > emas[20]) & (emas[20] > emas[50]) &
+        (close > prev_close_w)
+    )
+
+
+def compute_score_history(df, model=None, market_regime="NEUTRAL"):
+    """
+    Score every bar of an indicator frame in one pass.
+    Mirrors ai_strategy_score as called by analyze_stock (daily + weekly + ML, no intraday checks).
+    Returns a DataFrame indexed by bar with score and matched_mask.
+    """
+    if df.empty or len(df) < 2:
+        return pd.DataFrame(columns=["score", "matched_mask"])
+
+    prev = df.shift(1)
+    price = (df['Close'] > df['EMA_20']) & (df['EMA_20'] > df['EMA_50'])
+    ema_trend = ~price & (df['EMA_20'] > prev['EMA_20']) & (df['EMA_50'] > prev['EMA_50'])
+
+    rules = [
+        ("price", "price_trend", price.to_numpy()),
+        ("ema_trend", "ema_trend", ema_trend.to_numpy()),
+        ("rsi", "rsi", df['RSI'].between(RSI_THRESHOLD_MIN, RSI_THRESHOLD_MAX).to_numpy()),
+        ("macd", "macd", ((df['MACD'] > df['Signal']) & (df['MACD_Hist'] > 0)).to_numpy()),
+        ("volume", "volume", (df['Volume'] > 1.5 * df['Volume_avg']).to_numpy()),
+        ("stoch", "stoch", ((df['Stoch_K'] > df['Stoch_D']) & (df['Stoch_K'] < STOCH_K_MAX)).to_numpy()),
+        ("willr", "willr", ((df['WilliamsR'] > -80) & (df['WilliamsR'] < WILLR_MAX)).to_numpy()),
+        ("pattern", "pattern", _candle_flags(df)),
+        ("bb_pos", "bb_position", (df['BB_Position'] < 0.85).to_numpy()),
+        ("momentum", "price_momentum", (df['Price_Change_3D'] > 0).to_numpy()),
+        ("weekly", "weekly_confirmation", _weekly_confirmation(df)),
+    ]
+
+    if model:
+        try:
+            X = df[MODEL_FEATURE_COLUMNS].to_numpy()
+            y_pred = model.predict(X)
+            y_prob = model.predict_proba(X)[:, 1]
+            rules.append(("ml", "ml_prediction", (y_pred == 1) & (y_prob > 0.6)))
+        except Exception as e:
+            print(f"⚠️ ML failed in score history: {e}")
+
+    score = np.zeros(len(df))
+    mask = np.zeros(len(df), dtype=np.int64)
+    for rule, weight_key, hit in rules:
+        hit = np.asarray(hit, dtype=bool)
+        score = score + np.where(hit, STRATEGY_WEIGHTS[weight_key], 0.0)
+        mask |= np.where(hit, RULE_BITS[rule], 0)
+
+    multiplier = REGIME_MULTIPLIERS.get(market_regime, 1.0)
+    history = pd.DataFrame({
+        "score": [round(s * multiplier, 2) for s in score],
+        "matched_mask": mask
+    }, index=df.index)
+
+    # The first bar has no previous bar to compare against
+    return history.iloc[1:]
+
+
+def build_ticker_history(ticker, raw_df, model=None):
+    if raw_df is None or len(raw_df) < 50:
+        return None
+    df = calculate_additional_indicators(raw_df)
+    df.dropna(inplace=True)
+    history = compute_score_history(df, model=model)
+    if history.empty:
+        return None
+    history.insert(0, "ticker", ticker)
+    history.index.name = "bar_date"
+    return history.reset_index()
+
+
+def store_score_history(history):
+    rows = [
+        {
+            "ticker": row.ticker,
+            "bar_date": str(pd.Timestamp(row.bar_date).date()),
+            "score": float(row.score),
+            "matched_mask": int(row.matched_mask)
+        }
+        for row in history.itertuples(index=False)
+    ]
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        supabase.table(SCORE_HISTORY_TABLE) \
+            .upsert(rows[start:start + UPSERT_CHUNK_SIZE], on_conflict="ticker,bar_date") \
+            .execute()
+    print(f"✅ Stored {len(rows)} score history rows.")
+    return len(rows)
+
+
+def run_score_history(tickers, period="6mo", job=None):
+    """
+    Score every bar of every ticker and persist the result to score_history.
+    When job is cancelled, the histories scored so far are still stored.
+    """
+    tickers = list(tickers)
+    if job:
+        job.set_total(len(tickers))
+    model = load_ai_model()
+    frames = fetch_ohlcv_batch(tickers, period=period)
+    if job:
+        job.tick(len(tickers) - len(frames))  # No data to score
+
+    histories = []
+    for ticker, raw_df in frames.items():
+        if job and job.cancelled:
+            break
+        try:
+            history = build_ticker_history(ticker, raw_df, model=model)
+            if history is not None:
+                histories.append(history)
+            if job:
+                job.tick()
+        except Exception as e:
+            print(f"❌ Score history failed for {ticker}: {e}")
+            if job:
+                job.tick(errors=1)
+
+    if not histories:
+        print("⚠️ No score history produced.")
+        return {"tickers": 0, "rows": 0}
+
+    history = pd.concat(histories, ignore_index=True)
+    stored = store_score_history(history)
+    return {"tickers": len(histories), "rows": stored}
+
+
+def get_score_history(ticker=None, since=None, min_score=None, limit=5000):
+    try:
+        query = supabase.table(SCORE_HISTORY_TABLE).select("ticker, bar_date, score, matched_mask")
+        if ticker:
+            query = query.eq("ticker", ticker)
+        if since:
+            query = query.gte("bar_date", since)
+        if min_score is not None:
+            query = query.gte("score", min_score)
+        response = query.order("bar_date", desc=True).limit(limit).execute()
+
+        return [
+            {**row, "matched_indicators": decode_matched_mask(row["matched_mask"])}
+            for row in response.data
+        ]
+    except Exception as e:
+        print(f"❌ Failed to fetch score history: {e}")
+        return []
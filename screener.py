@@ -1,6 +1,3 @@
-import yfinance as yf
-import pandas as pd
-import time
 from supabase import create_client, Client
 import os
 from indicators import (
@@ -12,10 +9,20 @@ from indicators import (
     SUPABASE_URL,
     SUPABASE_KEY
 )
+from market_data import fetch_ohlcv
+from screener_state import TickerStateStore
+from screening_engine import ScreeningEngine, ScreeningPipeline, BatchFetcher
+from universe_metadata import UniverseMetadata
+from market_snapshot import SNAPSHOT_PERIOD, MarketSnapshot, MarketSnapshotSink
+from response_cache import StaleWhileRevalidateCache
 
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Batches written by another process show up after at most this many seconds
+LATEST_BATCH_TTL = 300
+latest_batch_cache = StaleWhileRevalidateCache(LATEST_BATCH_TTL)
+
 def fetch_nifty_stocks():
     try:
         response = supabase.table("master_stocks") \
@@ -35,21 +42,33 @@ def fetch_nifty_stocks():
 def analyze_stock(ticker):
     print(f"\n📊 Analyzing: {ticker}")
     try:
-        df = yf.download(ticker, period="6mo", interval="1d", progress=False)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        df.columns.name = None
-        print("1")
+        df = fetch_ohlcv(ticker, period="6mo")
+    except Exception as e:
+        print(f"❌ Error analyzing {ticker}: {e}")
+        return None
+    return analyze_stock_df(ticker, df)
 
-        df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna().astype(float)
-        if df.empty or len(df) < 50:
+def analyze_stock_df(ticker, df):
+    try:
+        print("1")
+        if df is None or df.empty or len(df) < 50:
             print("⚠️ Not enough data.")
             return None
 
         print("2")
         df = calculate_additional_indicators(df)
         df.dropna(inplace=True)
+        return score_stock_frame(ticker, df)
 
+    except Exception as e:
+        print(f"❌ Error analyzing {ticker}: {e}")
+        return None
+
+def score_stock_frame(ticker, df):
+    """
+    Scoring stage of the screener pipeline: df already carries the indicators
+    """
+    try:
         # Weekly timeframe
         df_weekly = df.resample('W').agg({
             'Open': 'first',
@@ -133,20 +152,48 @@ def analyze_stock(ticker):
         print(f"❌ Error analyzing {ticker}: {e}")
         return None
 
-def run_screener():
-    matches = []
+def build_screener_pipeline():
+    return ScreeningPipeline(score_stock_frame)
+
+def build_screener_engine(workers=None, job=None, incremental=False, qualifier=None,
+                          chunk_size=None, sinks=()):
+    """
+    The daily screener as a ScreeningEngine configuration; incremental
+    re-scores only tickers whose last bar or OHLCV inputs changed.
+    Illiquid / penny tickers are dropped from cached universe metadata first,
+    and every download is written to the market snapshot for the trading run.
+    Outside market hours, bars already snapshotted after the close are not
+    downloaded again.
+    """
+    snapshot = MarketSnapshot()
+    return ScreeningEngine(
+        build_screener_pipeline(),
+        fetcher=BatchFetcher(period=SNAPSHOT_PERIOD, chunk_size=chunk_size, snapshot=snapshot),
+        qualifier=qualifier,
+        sinks=[MarketSnapshotSink(snapshot), *sinks],
+        workers=workers,
+        job=job,
+        state_store=TickerStateStore("screener") if incremental else None,
+        universe_filter=UniverseMetadata().tradable
+    )
+
+def run_screener(workers=None, job=None, incremental=False):
     tickers = fetch_nifty_stocks()
+    engine = build_screener_engine(workers=workers, job=job, incremental=incremental)
+    matches = engine.run(tickers)
 
-    for ticker in tickers:
-        stock = analyze_stock(ticker)
-        if stock:
-            matches.append(stock)
-        time.sleep(0.2)
+    if engine.cancelled:
+        print(f"🛑 Screener cancelled after {job.processed} tickers — nothing stored.")
+        return {"matches": len(matches), "stored": False}
 
+    return store_screener_matches(matches)
+
+def store_screener_matches(matches, source="auto"):
+    batch_id = None
     if matches:
         batch_res = supabase.table("screener_batches").insert({
             "num_matches": len(matches),
-            "source": "auto"
+            "source": source
         }).execute()
         batch_id = batch_res.data[0]["id"]
         print(f"📦 Created Screener Batch ID: {batch_id}")
@@ -162,6 +209,7 @@ def run_screener():
         ]
 
         supabase.table("screener_results").insert(results_payload).execute()
+        invalidate_latest_screener_batch()
         print(f"✅ Stored {len(results_payload)} screener results.")
 
         for stock in matches:
@@ -181,33 +229,55 @@ def run_screener():
     else:
         send_telegram("🛘 *No stocks matched advanced criteria today.*")
 
-def get_latest_screener_batch():
+    return {"matches": len(matches), "stored": bool(matches), "batch_id": batch_id}
+
+def _fetch_latest_screener_batch():
     try:
-        batch_res = supabase.table("screener_batches") \
-            .select("id, timestamp") \
-            .order("timestamp", desc=True) \
-            .limit(1) \
-            .execute()
+        res = supabase.table("latest_screener_batch").select("*").limit(1).execute()
+    except Exception as e:
+        print(f"⚠️ latest_screener_batch view unavailable, using two queries: {e}")
+        return _fetch_latest_screener_batch_two_queries()
 
-        if not batch_res.data:
-            return {"refreshed_at": None, "tickers": []}
+    if not res.data:
+        return {"batch_id": None, "refreshed_at": None, "tickers": []}
 
-        batch = batch_res.data[0]
-        batch_id = batch["id"]
-        refreshed_at = batch["timestamp"]
-        print(f"📦 Latest Screener Batch ID: {batch_id} @ {refreshed_at}")
+    batch = res.data[0]
+    print(f"📦 Latest Screener Batch ID: {batch['batch_id']} @ {batch['refreshed_at']}")
+    return {"batch_id": batch["batch_id"], "refreshed_at": batch["refreshed_at"], "tickers": batch["tickers"] or []}
 
-        result_res = supabase.table("screener_results") \
-            .select("ticker") \
-            .eq("batch_id", batch_id) \
-            .limit(2999) \
-            .execute()
+def _fetch_latest_screener_batch_two_queries():
+    batch_res = supabase.table("screener_batches") \
+        .select("id, timestamp") \
+        .order("timestamp", desc=True) \
+        .limit(1) \
+        .execute()
+
+    if not batch_res.data:
+        return {"batch_id": None, "refreshed_at": None, "tickers": []}
+
+    batch = batch_res.data[0]
+    result_res = supabase.table("screener_results") \
+        .select("ticker") \
+        .eq("batch_id", batch["id"]) \
+        .limit(2999) \
+        .execute()
+
+    tickers = [row["ticker"] for row in result_res.data]
+    return {"batch_id": batch["id"], "refreshed_at": batch["timestamp"], "tickers": tickers}
 
-        tickers = [row["ticker"] for row in result_res.data]
-        return {"refreshed_at": refreshed_at, "tickers": tickers}
+def get_latest_screener_batch():
+    """
+    Latest batch and its tickers, cached in-process until a new batch is stored
+    """
+    try:
+        batch, _ = latest_batch_cache.get("latest", _fetch_latest_screener_batch)
+        return batch
     except Exception as e:
         print(f"❌ Failed to fetch latest screener batch: {e}")
-        return {"refreshed_at": None, "tickers": []}
+        return {"batch_id": None, "refreshed_at": None, "tickers": []}
+
+def invalidate_latest_screener_batch():
+    latest_batch_cache.invalidate()
 
 if __name__ == "__main__":
     run_screener()
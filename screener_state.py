@@ -0,0 +1,81 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+import pandas as pd
+from local_store import connect
+
+STATE_DB = "screener_state.db"
+
+
+def fingerprint_frame(df):
+    """
+    (last bar timestamp, hash of the full OHLCV input) for a ticker's frame
+    """
+    if df is None or df.empty:
+        return None, None
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes()).hexdigest()
+    return str(df.index[-1]), digest
+
+
+class TickerStateStore:
+    """
+    Last evaluated bar, inputs hash and screening record per ticker for
+    incremental screening. Each pipeline keeps its own namespace.
+    """
+    def __init__(self, namespace="screener", db_name=STATE_DB):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.conn = connect(db_name)
+        self.conn.execute("""
+            create table if not exists pipeline_state (
+                namespace text not null,
+                ticker text not null,
+                bar_ts text,
+                inputs_hash text,
+                record_json text,
+                evaluated_at text,
+                primary key (namespace, ticker)
+            )
+        """)
+        self.conn.commit()
+
+    def load(self, tickers):
+        tickers = list(tickers)
+        state = {}
+        with self._lock:
+            for start in range(0, len(tickers), 500):
+                chunk = tickers[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"select * from pipeline_state where namespace = ? and ticker in ({placeholders})",
+                    [self.namespace, *chunk]
+                ).fetchall()
+                for row in rows:
+                    state[row["ticker"]] = {
+                        "bar_ts": row["bar_ts"],
+                        "inputs_hash": row["inputs_hash"],
+                        "record": json.loads(row["record_json"]) if row["record_json"] else None
+                    }
+        return state
+
+    def save(self, entries):
+        """
+        entries: iterable of (ticker, (bar_ts, inputs_hash), record)
+        """
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (self.namespace, ticker, bar_ts, inputs_hash, json.dumps(record, default=str) if record else None, now)
+            for ticker, (bar_ts, inputs_hash), record in entries
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "insert or replace into pipeline_state values (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("delete from pipeline_state where namespace = ?", (self.namespace,))
+            self.conn.commit()
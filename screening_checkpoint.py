@@ -0,0 +1,105 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+from local_store import connect
+
+CHECKPOINT_DB = "screening_checkpoints.db"
+CHECKPOINT_EVERY = 25        # Tickers per checkpoint flush
+CHECKPOINT_MAX_AGE_HOURS = 6  # Older unfinished runs are not resumed
+
+
+class ScreeningCheckpoint:
+    """
+    Periodically persists per-ticker screening records so an interrupted run
+    can resume where it stopped instead of starting from ticker #1
+    """
+    def __init__(self, source, db_name=CHECKPOINT_DB, flush_every=CHECKPOINT_EVERY,
+                 max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+        self.source = source
+        self.flush_every = flush_every
+        self.max_age = timedelta(hours=max_age_hours)
+        self.run_id = None
+        self._pending = []
+        self.conn = connect(db_name)
+        self.conn.executescript("""
+            create table if not exists checkpoint_runs (
+                run_id text primary key,
+                source text not null,
+                status text not null,
+                started_at text not null,
+                updated_at text not null
+            );
+            create table if not exists checkpoint_records (
+                run_id text not null,
+                ticker text not null,
+                record_json text,
+                primary key (run_id, ticker)
+            );
+        """)
+        self.conn.commit()
+
+    def resume(self):
+        """
+        Attach to the latest unfinished run of this source (or start a new one).
+        Returns {ticker: record} for tickers that are already done.
+        """
+        cutoff = (datetime.utcnow() - self.max_age).isoformat()
+        row = self.conn.execute(
+            "select run_id from checkpoint_runs where source = ? and status = 'running' "
+            "and updated_at >= ? order by started_at desc limit 1",
+            (self.source, cutoff)
+        ).fetchone()
+
+        if row:
+            self.run_id = row["run_id"]
+            rows = self.conn.execute(
+                "select ticker, record_json from checkpoint_records where run_id = ?", (self.run_id,)
+            ).fetchall()
+            done = {r["ticker"]: json.loads(r["record_json"]) if r["record_json"] else None for r in rows}
+            print(f"⏯️ Resuming {self.source} run {self.run_id}: {len(done)} tickers already done")
+            return done
+
+        now = datetime.utcnow().isoformat()
+        self.run_id = uuid.uuid4().hex[:12]
+        self.conn.execute(
+            "update checkpoint_runs set status = 'abandoned' where source = ? and status = 'running'",
+            (self.source,)
+        )
+        self.conn.execute(
+            "insert into checkpoint_runs values (?, ?, 'running', ?, ?)",
+            (self.run_id, self.source, now, now)
+        )
+        self.conn.commit()
+        return {}
+
+    def add(self, ticker, record):
+        self._pending.append((self.run_id, ticker, json.dumps(record, default=str) if record else None))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        self.conn.executemany(
+            "insert or replace into checkpoint_records values (?, ?, ?)", self._pending
+        )
+        self.conn.execute(
+            "update checkpoint_runs set updated_at = ? where run_id = ?",
+            (datetime.utcnow().isoformat(), self.run_id)
+        )
+        self.conn.commit()
+        print(f"💾 Checkpoint: {len(self._pending)} tickers saved for run {self.run_id}")
+        self._pending = []
+
+    def complete(self):
+        self.flush()
+        self.conn.execute(
+            "update checkpoint_runs set status = 'completed', updated_at = ? where run_id = ?",
+            (datetime.utcnow().isoformat(), self.run_id)
+        )
+        self.conn.execute(
+            "delete from checkpoint_records where run_id in "
+            "(select run_id from checkpoint_runs where source = ? and status != 'running')",
+            (self.source,)
+        )
+        self.conn.commit()
@@ -0,0 +1,258 @@
+from indicators import calculate_additional_indicators
+from market_data import fetch_ohlcv_batch, DOWNLOAD_CHUNK_SIZE
+from parallel_screener import run_sharded, resolve_workers
+from screener_state import fingerprint_frame
+
+
+def indicator_frame(raw_df):
+    """Default indicator stage: None when there is not enough data"""
+    if raw_df is None or raw_df.empty or len(raw_df) < 50:
+        return None
+
+    df = calculate_additional_indicators(raw_df)
+    df.dropna(inplace=True)
+    return None if df.empty else df
+
+
+class BatchFetcher:
+    """
+    Fetch stage: downloads OHLCV in batched yfinance calls, one chunk at a time.
+    With a snapshot (same period), frames that cannot have changed since the
+    last close are read from it instead of downloaded.
+    """
+    def __init__(self, period="6mo", chunk_size=None, snapshot=None):
+        self.period = period
+        self.chunk_size = chunk_size or DOWNLOAD_CHUNK_SIZE
+        self.snapshot = snapshot
+
+    def iter_chunks(self, tickers):
+        for start in range(0, len(tickers), self.chunk_size):
+            chunk = tickers[start:start + self.chunk_size]
+            frames = self.snapshot.load_final(chunk) if self.snapshot else {}
+            missing = [ticker for ticker in chunk if ticker not in frames]
+            if missing:
+                frames.update(fetch_ohlcv_batch(missing, period=self.period, chunk_size=self.chunk_size))
+            yield chunk, frames
+
+    def fetch_all(self, tickers):
+        frames = {}
+        for _, chunk_frames in self.iter_chunks(tickers):
+            frames.update(chunk_frames)
+        return frames
+
+
+class ScreeningPipeline:
+    """
+    Per-ticker stages: indicators -> filters -> scorer.
+    Stages must be module-level functions (or partials of them) when the
+    pipeline runs in worker processes.
+      indicators(raw_df) -> df or None
+      filter(df) -> bool
+      scorer(ticker, df) -> result dict or None
+    """
+    def __init__(self, scorer, indicators=indicator_frame, filters=()):
+        self.scorer = scorer
+        self.indicators = indicators
+        self.filters = list(filters)
+
+    def process(self, ticker, raw_df):
+        """
+        Returns a compact record: {"passed": bool, "result": dict or None}
+        """
+        try:
+            df = self.indicators(raw_df) if self.indicators else raw_df
+            if df is None or not all(check(df) for check in self.filters):
+                return {"passed": False, "result": None}
+        except Exception as e:
+            print(f"⚠️ Filter error for {ticker}: {e}")
+            return {"passed": False, "result": None}
+
+        try:
+            result = self.scorer(ticker, df)
+        except Exception as e:
+            print(f"⚠️ Analysis error for {ticker}: {e}")
+            result = None
+        return {"passed": True, "result": result}
+
+
+def _process_prefetched(ticker, raw_df, pipeline):
+    return pipeline.process(ticker, raw_df)
+
+
+class ScreeningEngine:
+    """
+    Runs a ScreeningPipeline over a ticker universe. Every entry point gets
+    batching, de-duplication, parallelism, incremental re-scoring,
+    checkpoint/resume, job progress and sinks from here.
+
+    Sinks may define on_frames(frames), on_result(ticker, record, qualified)
+    and on_complete(matches, stats).
+    universe_filter(tickers) -> tickers drops untradable tickers before any download.
+    """
+    def __init__(self, pipeline, fetcher=None, qualifier=None, sinks=(), workers=None,
+                 job=None, state_store=None, checkpoint=None, seen=None, universe_filter=None):
+        self.pipeline = pipeline
+        self.fetcher = fetcher or BatchFetcher()
+        self.universe_filter = universe_filter
+        self.qualifier = qualifier
+        self.sinks = list(sinks)
+        self.workers = workers
+        self.job = job
+        self.state_store = state_store
+        self.checkpoint = checkpoint
+        self.seen = seen if seen is not None else set()
+        self.stats = {
+            'total': 0,
+            'duplicates': 0,
+            'prefiltered': 0,
+            'resumed': 0,
+            'carried_forward': 0,
+            'passed_filters': 0,
+            'scored': 0,
+            'qualified': 0,
+            'last_bar': None
+        }
+        self.matches = []
+
+    @property
+    def cancelled(self):
+        return bool(self.job and self.job.cancelled)
+
+    def _is_qualified(self, result):
+        return bool(result) and (self.qualifier is None or self.qualifier(result))
+
+    def _record(self, ticker, record, tick=True):
+        qualified = False
+        if record and record['passed']:
+            self.stats['passed_filters'] += 1
+            if record['result']:
+                self.stats['scored'] += 1
+                qualified = self._is_qualified(record['result'])
+        if qualified:
+            self.stats['qualified'] += 1
+            self.matches.append(record['result'])
+        if self.job:
+            self.job.tick(1 if tick else 0, qualified=1 if qualified else 0)
+        for sink in self.sinks:
+            if hasattr(sink, "on_result"):
+                sink.on_result(ticker, record, qualified)
+        return qualified
+
+    def _dedupe(self, tickers):
+        unique = []
+        for ticker in tickers:
+            self.stats['total'] += 1
+            if ticker in self.seen:
+                print(f"⚠️ Skipping duplicate ticker in this session: {ticker}")
+                self.stats['duplicates'] += 1
+                if self.job:
+                    self.job.tick()
+                continue
+            self.seen.add(ticker)
+            unique.append(ticker)
+        return unique
+
+    def iter_results(self, tickers):
+        """
+        Yield (ticker, record, qualified) as each ticker completes
+        """
+        tickers = list(tickers)
+        if self.job:
+            self.job.set_total(len(tickers))
+        unique = self._dedupe(tickers)
+        if self.universe_filter:
+            tradable = self.universe_filter(unique)
+            self.stats['prefiltered'] = len(unique) - len(tradable)
+            if self.job:
+                self.job.tick(self.stats['prefiltered'])
+            unique = tradable
+
+        done = self.checkpoint.resume() if self.checkpoint else {}
+        pending = []
+        for ticker in unique:
+            if ticker in done:
+                self.stats['resumed'] += 1
+                yield ticker, done[ticker], self._record(ticker, done[ticker])
+            else:
+                pending.append(ticker)
+
+        if self.state_store is not None or resolve_workers(self.workers) > 1:
+            yield from self._iter_prefetched(pending)
+        else:
+            yield from self._iter_serial(pending)
+
+        if self.checkpoint:
+            if self.cancelled:
+                self.checkpoint.flush()  # Keep the run resumable
+            else:
+                self.checkpoint.complete()
+
+    def _fetched(self, frames):
+        bars = [str(df.index[-1]) for df in frames.values() if df is not None and not df.empty]
+        if bars:
+            self.stats['last_bar'] = max(bars + [self.stats['last_bar'] or ""])
+        for sink in self.sinks:
+            if hasattr(sink, "on_frames"):
+                sink.on_frames(frames)
+        return frames
+
+    def _finish(self, ticker, record, tick=True, checkpointed=False):
+        if self.checkpoint and not checkpointed:
+            self.checkpoint.add(ticker, record)
+        return ticker, record, self._record(ticker, record, tick=tick)
+
+    def _checkpoint_shard(self, records):
+        # Results only come back once every shard is done: save each shard as
+        # it completes so an interrupted run can resume
+        for ticker, record in records:
+            self.checkpoint.add(ticker, record)
+        self.checkpoint.flush()
+
+    def _iter_serial(self, tickers):
+        for chunk, frames in self.fetcher.iter_chunks(tickers):
+            self._fetched(frames)
+            for ticker in chunk:
+                if self.cancelled:
+                    return
+                yield self._finish(ticker, self.pipeline.process(ticker, frames.get(ticker)))
+
+
+    def _iter_prefetched(self, tickers):
+        frames = self._fetched(self.fetcher.fetch_all(tickers))
+
+        changed = tickers
+        fingerprints = {}
+        if self.state_store is not None:
+            previous = self.state_store.load(tickers)
+            changed = []
+            for ticker in tickers:
+                fingerprints[ticker] = fingerprint_frame(frames.get(ticker))
+                state = previous.get(ticker)
+                if state and (state["bar_ts"], state["inputs_hash"]) == fingerprints[ticker]:
+                    self.stats['carried_forward'] += 1
+                    yield self._finish(ticker, state["record"])
+                else:
+                    changed.append(ticker)
+            print(f"♻️ Incremental screening: {len(changed)} changed, {len(tickers) - len(changed)} carried forward")
+
+        records = run_sharded(
+            _process_prefetched, changed, workers=self.workers,
+            context=self.pipeline, frames=frames, job=self.job,
+            on_shard=self._checkpoint_shard if self.checkpoint else None
+        )
+        for ticker, record in records:
+            yield self._finish(ticker, record, tick=False, checkpointed=self.checkpoint is not None)
+
+        if self.state_store is not None:
+            self.state_store.save((ticker, fingerprints[ticker], record) for ticker, record in records)
+
+    def run(self, tickers):
+        for _ in self.iter_results(tickers):
+            pass
+
+        if not self.cancelled:
+            for sink in self.sinks:
+                if hasattr(sink, "on_complete"):
+                    sink.on_complete(self.matches, self.stats)
+        print(f"📊 Screening stats: {self.stats}")
+        return self.matches
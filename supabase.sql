@@ -5,3 +5,244 @@ create table trades (
   side text, 
   price decimal(10,2)
 );
+
+-- Per-bar ai_strategy_score history (written by score_history.py)
+-- matched_mask bits follow score_history.SCORE_RULES
+create table if not exists score_history (
+  ticker text not null,
+  bar_date date not null,
+  score numeric(6,2) not null,
+  matched_mask smallint not null,
+  primary key (ticker, bar_date)
+);
+create index if not exists score_history_bar_date_idx on score_history (bar_date);
+
+-- Latest screener batch with its tickers in one row (read by screener.get_latest_screener_batch)
+create index if not exists screener_batches_timestamp_idx on screener_batches (timestamp desc);
+create index if not exists screener_results_batch_id_idx on screener_results (batch_id);
+create or replace view latest_screener_batch as
+select
+  b.id as batch_id,
+  b.timestamp as refreshed_at,
+  coalesce(
+    (select json_agg(r.ticker) from screener_results r where r.batch_id = b.id),
+    '[]'::json
+  ) as tickers
+from (select id, timestamp from screener_batches order by timestamp desc limit 1) b;
+
+-- Latest trade per ticker (read once per /run-trades by trading.get_last_trades)
+create index if not exists trades_ticker_timestamp_idx on trades (ticker, timestamp desc);
+create or replace view latest_trades as
+select distinct on (ticker) *
+from trades
+order by ticker, timestamp desc;
+
+-- Client-side idempotency key: queued and retried trade inserts are written
+-- as upsert(on_conflict=order_id, ignore_duplicates) (unit_of_work.insert_once)
+alter table trades add column if not exists order_id text;
+create unique index if not exists trades_order_id_key on trades (order_id);
+
+-- Bulk partial-row updates of trades by id (unit_of_work.bulk_update); each
+-- element of updates is {"id": ..., <column>: <value>, ...} and only the given
+-- columns change. Only the columns the bot updates are accepted, and the
+-- function runs with the caller's privileges, so /rpc/bulk_update_trades can
+-- do nothing a plain PATCH on trades could not.
+drop function if exists bulk_update(regclass, jsonb);
+create or replace function bulk_update_trades(updates jsonb) returns integer
+language plpgsql security invoker as $$
+declare
+  allowed constant text[] := array[
+    'status', 'reason', 'stop_loss', 'target_1', 'target_2', 'target_3',
+    'current_price', 'unrealized_pnl', 'position_value', 'pnl', 'pnl_percent',
+    'exit_price', 'exit_reason', 'exit_date', 'days_held', 'last_updated'
+  ];
+  u jsonb;
+  rejected text[];
+  assignments text;
+  changed integer;
+  applied integer := 0;
+begin
+  for u in select * from jsonb_array_elements(updates) loop
+    select array_agg(key) into rejected
+      from jsonb_object_keys(u - 'id') as key
+      where key <> all (allowed);
+    if rejected is not null then
+      raise exception 'bulk_update_trades: columns not allowed: %', rejected;
+    end if;
+    select string_agg(format('%I = r.%I', key, key), ', ')
+      into assignments
+      from jsonb_object_keys(u - 'id') as key;
+    continue when assignments is null;
+    execute format(
+      'update trades t set %s from jsonb_populate_record(null::trades, $1) r where t.id = r.id',
+      assignments
+    ) using u;
+    get diagnostics changed = row_count;
+    applied := applied + changed;
+  end loop;
+  return applied;
+end $$;
+
+-- One row per BUY with its exit: the first later SELL row of the ticker, or the
+-- exit columns the bot writes when it closes a trade in place
+-- (read page by page by trading.get_trades_with_summary)
+create index if not exists trades_sells_ticker_timestamp_idx on trades (ticker, timestamp) where action = 'SELL';
+create index if not exists trades_buys_timestamp_idx on trades (timestamp desc, id desc) where action = 'BUY';
+create or replace view trade_positions as
+select
+  b.id,
+  b.ticker,
+  b.price,
+  coalesce(b.quantity, 1) as quantity,
+  coalesce(b.total_invested, b.price * coalesce(b.quantity, 1)) as total_invested,
+  b.timestamp,
+  b.reason,
+  b.score,
+  b.market_regime,
+  b.stop_loss,
+  b.target_1,
+  b.target_2,
+  b.target_3,
+  case when s.id is not null or upper(b.status) = 'CLOSED' then 'CLOSED' else 'OPEN' end as position_status,
+  coalesce(s.price, b.exit_price) as sell_price,
+  coalesce(s.timestamp, b.exit_date::timestamptz) as sell_timestamp,
+  coalesce(s.reason, b.exit_reason) as sell_reason
+from trades b
+left join lateral (
+  select id, price, timestamp, reason
+  from trades s
+  where s.action = 'SELL' and s.ticker = b.ticker and s.timestamp > b.timestamp
+  order by s.timestamp
+  limit 1
+) s on true
+where b.action = 'BUY';
+
+-- Per-status totals for the summary; open positions are marked to market in Python
+create or replace view trade_position_totals as
+select
+  position_status,
+  count(*) as trades,
+  sum(total_invested) as total_invested,
+  sum(sell_price * quantity) as exit_value,
+  count(*) filter (where sell_price * quantity > total_invested) as winning_trades
+from trade_positions
+where position_status = 'OPEN' or sell_price is not null
+group by position_status;
+
+-- Portfolio totals kept current by a trigger on trades, so /trades-summary reads
+-- one row instead of aggregating the history. Only BUY rows count: open ones by
+-- invested amount, closed ones (with an exit price) by exit value and win.
+-- Every trade write updates the same row, so concurrent writers serialise on
+-- its row lock until they commit; fine at the bot's write rate, but split it
+-- into per-status delta rows if writes ever contend.
+-- Repair with: select * from rebuild_portfolio_summary();
+
+create table if not exists portfolio_summary (
+  id integer primary key default 1 check (id = 1),
+  open_trades integer not null default 0,
+  open_invested numeric not null default 0,
+  closed_trades integer not null default 0,
+  closed_invested numeric not null default 0,
+  closed_exit_value numeric not null default 0,
+  winning_trades integer not null default 0,
+  updated_at timestamp with time zone default now()
+);
+insert into portfolio_summary (id) values (1) on conflict (id) do nothing;
+
+create or replace function portfolio_summary_add(r trades, direction integer) returns void
+language plpgsql as $$
+declare
+  qty numeric := coalesce(r.quantity, 1);
+  invested numeric := coalesce(r.total_invested, r.price * coalesce(r.quantity, 1));
+begin
+  if r.action is distinct from 'BUY' then
+    return;
+  end if;
+  if coalesce(upper(r.status), '') = 'CLOSED' then
+    if r.exit_price is null then
+      return;
+    end if;
+    update portfolio_summary set
+      closed_trades = closed_trades + direction,
+      closed_invested = closed_invested + direction * invested,
+      closed_exit_value = closed_exit_value + direction * r.exit_price * qty,
+      winning_trades = winning_trades + case when r.exit_price * qty > invested then direction else 0 end,
+      updated_at = now()
+    where id = 1;
+  else
+    update portfolio_summary set
+      open_trades = open_trades + direction,
+      open_invested = open_invested + direction * invested,
+      updated_at = now()
+    where id = 1;
+  end if;
+end $$;
+
+create or replace function trades_portfolio_summary() returns trigger
+language plpgsql as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    perform portfolio_summary_add(old, -1);
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform portfolio_summary_add(new, 1);
+  end if;
+  return null;
+end $$;
+
+-- Full recompute from the trades table (portfolio_summary.rebuild_portfolio_summary / /rebuild-portfolio-summary)
+create or replace function rebuild_portfolio_summary() returns setof portfolio_summary
+language sql as $$
+  with buys as (
+    select
+      coalesce(upper(status), '') = 'CLOSED' as closed,
+      exit_price * coalesce(quantity, 1) as exit_value,
+      coalesce(total_invested, price * coalesce(quantity, 1)) as invested
+    from trades
+    where action = 'BUY'
+  )
+  update portfolio_summary set
+    open_trades = (select count(*) from buys where not closed),
+    open_invested = (select coalesce(sum(invested), 0) from buys where not closed),
+    closed_trades = (select count(*) from buys where closed and exit_value is not null),
+    closed_invested = (select coalesce(sum(invested), 0) from buys where closed and exit_value is not null),
+    closed_exit_value = (select coalesce(sum(exit_value), 0) from buys where closed and exit_value is not null),
+    winning_trades = (select count(*) from buys where closed and exit_value > invested),
+    updated_at = now()
+  where id = 1
+  returning *;
+$$;
+
+-- Migrate legacy rows, install the trigger and seed the summary from the
+-- existing trades in one transaction; the lock keeps writes out until all
+-- three are in place, so no row is missed or counted twice
+begin;
+lock table trades in share row exclusive mode;
+drop trigger if exists trades_portfolio_summary on trades;
+-- Close legacy BUY rows that were paired with a separate SELL row, the way
+-- the bot now closes trades in place (the bot no longer writes SELL rows, so
+-- re-running this finds nothing to change)
+with paired as (
+  select b.id, s.price, s.timestamp, s.reason
+  from trades b
+  join lateral (
+    select price, timestamp, reason
+    from trades s
+    where s.action = 'SELL' and s.ticker = b.ticker and s.timestamp > b.timestamp
+    order by s.timestamp
+    limit 1
+  ) s on true
+  where b.action = 'BUY' and coalesce(upper(b.status), '') <> 'CLOSED'
+)
+update trades t
+set status = 'CLOSED',
+    exit_price = p.price,
+    exit_date = p.timestamp,
+    exit_reason = coalesce(t.exit_reason, p.reason)
+from paired p
+where t.id = p.id;
+create trigger trades_portfolio_summary
+after insert or update or delete on trades
+for each row execute function trades_portfolio_summary();
+select rebuild_portfolio_summary();
+commit;
@@ -0,0 +1,20 @@
+import threading
+
+
+class TickerLocks:
+    """
+    One re-entrant lock per ticker, shared by everything in the process that
+    buys, sells or updates a position, so decisions for one symbol never
+    interleave while different symbols proceed in parallel
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def hold(self, ticker):
+        """Use as `with ticker_locks.hold(ticker):`"""
+        with self._lock:
+            return self._locks.setdefault(ticker, threading.RLock())
+
+
+ticker_locks = TickerLocks()
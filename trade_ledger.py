@@ -0,0 +1,232 @@
+import base64
+import json
+from bisect import bisect_right
+from datetime import timezone
+from dateutil.parser import isoparse, parse as parse_datetime
+
+
+class InvalidPageRequest(Exception):
+    """A trades-summary cursor or limit the client has to fix"""
+
+
+def pair_trades(trades):
+    """
+    Match every BUY with the first SELL of the same ticker stamped after it.
+    Returns [(buy, sell or None)] in the order the buys appear.
+    Sells are grouped by ticker and sorted once, and each buy bisects its
+    ticker's list, so pairing is O(n log n) instead of a scan per buy.
+    Timestamps compare as the ISO strings Supabase returns.
+    """
+    sells_by_ticker = {}
+    for trade in trades:
+        if trade["action"] == "SELL":
+            sells_by_ticker.setdefault(trade["ticker"], []).append(trade)
+
+    index = {}
+    for ticker, sells in sells_by_ticker.items():
+        # Stable sort: equal timestamps keep table order, as the scan did
+        sells.sort(key=lambda s: s["timestamp"])
+        index[ticker] = ([s["timestamp"] for s in sells], sells)
+
+    pairs = []
+    for trade in trades:
+        if trade["action"] != "BUY":
+            continue
+        sell = None
+        if trade["ticker"] in index:
+            stamps, sells = index[trade["ticker"]]
+            position = bisect_right(stamps, trade["timestamp"])
+            if position < len(sells):
+                sell = sells[position]
+        pairs.append((trade, sell))
+    return pairs
+
+
+# Columns of the trade_positions view (supabase.sql) served by /trades-summary
+POSITION_COLUMNS = [
+    "id", "ticker", "price", "quantity", "total_invested", "timestamp", "reason", "score",
+    "market_regime", "stop_loss", "target_1", "target_2", "target_3",
+    "position_status", "sell_price", "sell_timestamp", "sell_reason"
+]
+
+
+def positions_from_trades(trades):
+    """
+    trade_positions view rows computed in Python from raw trades rows
+    (used when the view is not available)
+    """
+    positions = []
+    for buy, sell in pair_trades(trades):
+        quantity = buy.get("quantity") or 1
+        closed = sell is not None or str(buy.get("status", "")).upper() == "CLOSED"
+        positions.append({
+            **{column: buy.get(column) for column in POSITION_COLUMNS},
+            "quantity": quantity,
+            "total_invested": buy.get("total_invested") or float(buy["price"]) * quantity,
+            "position_status": "CLOSED" if closed else "OPEN",
+            "sell_price": sell["price"] if sell else buy.get("exit_price"),
+            "sell_timestamp": sell["timestamp"] if sell else buy.get("exit_date"),
+            "sell_reason": sell.get("reason") if sell else buy.get("exit_reason"),
+        })
+    return positions
+
+
+def position_totals(positions):
+    """trade_position_totals view rows computed from position rows"""
+    totals = {}
+    for p in positions:
+        exit_value = float(p["sell_price"]) * p["quantity"] if p["sell_price"] is not None else None
+        if p["position_status"] == "CLOSED" and exit_value is None:
+            continue
+        row = totals.setdefault(p["position_status"], {
+            "position_status": p["position_status"], "trades": 0, "total_invested": 0.0,
+            "exit_value": 0.0, "winning_trades": 0
+        })
+        row["trades"] += 1
+        row["total_invested"] += float(p["total_invested"])
+        if exit_value is not None:
+            row["exit_value"] += exit_value
+            row["winning_trades"] += int(exit_value > float(p["total_invested"]))
+    return list(totals.values())
+
+
+def sort_column_for(status):
+    return "sell_timestamp" if status == "closed" else "timestamp"
+
+
+def encode_cursor(row, sort_column):
+    raw = json.dumps([row[sort_column], row["id"]], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    (sort value, id) of the last row of the previous page. Both end up in a
+    PostgREST filter, so anything but an ISO timestamp and an integer id is
+    rejected.
+    """
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        isoparse(sort_value)
+    except Exception:
+        raise InvalidPageRequest("Invalid cursor")
+    if not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise InvalidPageRequest("Invalid cursor")
+    return sort_value, row_id
+
+
+def page_positions(positions, status, limit, cursor=None):
+    """
+    One page of position rows, newest first, keyed on (sort column, id)
+    like the server-side query; returns (rows, next_cursor)
+    """
+    sort_column = sort_column_for(status)
+    rows = [
+        p for p in positions
+        if (status not in ("open", "closed") or p["position_status"] == status.upper())
+        and p[sort_column] is not None
+    ]
+    rows.sort(key=lambda p: (p[sort_column], p["id"]), reverse=True)
+    if cursor:
+        after = decode_cursor(cursor)
+        rows = [p for p in rows if (p[sort_column], p["id"]) < tuple(after)]
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1], sort_column) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def _days_between(start, end):
+    # exit_date is written without a zone (UTC); Supabase timestamps carry one
+    start, end = (parse_datetime(value) for value in (start, end))
+    start, end = (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc) for moment in (start, end))
+    return (end - start).days
+
+
+def value_position(position, quote=None):
+    """
+    /trades-summary row for a position: sell price when closed, otherwise
+    the quote record's price (stamped with its quoted_at); None when
+    neither is known
+    """
+    closed = position["position_status"] == "CLOSED"
+    current_price = quote["price"] if quote else None
+    final_price = float(position["sell_price"]) if closed and position["sell_price"] is not None else current_price
+    if not final_price:
+        return None
+
+    quantity = position["quantity"]
+    total_invested = float(position["total_invested"])
+    current_value = final_price * quantity
+    profit = current_value - total_invested
+    days_held = None
+    if closed and position["sell_timestamp"]:
+        days_held = _days_between(position["timestamp"], position["sell_timestamp"])
+
+    row = {column: position[column] for column in POSITION_COLUMNS if column not in (
+        "position_status", "sell_price", "sell_timestamp", "sell_reason"
+    )}
+    return {
+        **row,
+        "status": position["position_status"],
+        "sell_or_current_price": round(final_price, 2),
+        "current_value": round(current_value, 2),
+        "profit": round(profit, 2),
+        "profit_pct": round(profit / total_invested * 100, 2),
+        "reason": position["sell_reason"] if closed else position["reason"],
+        "sell_timestamp": position["sell_timestamp"],
+        "days_held": days_held,
+        "quoted_at": None if closed else quote["quoted_at"]
+    }
+
+
+def oldest_quote(quoted_ats):
+    """Earliest of the given quote timestamps, i.e. how fresh the whole valuation is"""
+    stamps = [stamp for stamp in quoted_ats if stamp]
+    return min(stamps, key=parse_datetime) if stamps else None
+
+
+def build_summary(status, totals, open_values, quotes_as_of=None):
+    """
+    Portfolio totals for one status scope ("open", "closed" or all).
+    totals: trade_position_totals rows; open_values: [(total_invested,
+    current_value)] for every open position that could be priced;
+    quotes_as_of: timestamp of the oldest quote behind those values.
+    """
+    by_status = {row["position_status"]: row for row in totals}
+    closed = by_status.get("CLOSED", {})
+    closed_part = (
+        float(closed.get("total_invested") or 0),
+        float(closed.get("exit_value") or 0),
+        int(closed.get("winning_trades") or 0)
+    )
+    open_part = (
+        sum(invested for invested, _ in open_values),
+        sum(value for _, value in open_values),
+        sum(1 for invested, value in open_values if value > invested)
+    )
+    open_trades = len(open_values)
+    closed_trades = int(closed.get("trades") or 0)
+
+    if status == "open":
+        parts, considered = [open_part], open_trades
+    elif status == "closed":
+        parts, considered = [closed_part], closed_trades
+    else:
+        parts, considered = [open_part, closed_part], open_trades + closed_trades
+
+    total_invested = sum(part[0] for part in parts)
+    current_value = sum(part[1] for part in parts)
+    winning_trades = sum(part[2] for part in parts)
+    profit = current_value - total_invested
+    return {
+        "total_invested": round(total_invested, 2),
+        "current_value": round(current_value, 2),
+        "profit": round(profit, 2),
+        "profit_pct": round(profit / total_invested * 100, 2) if total_invested > 0 else 0,
+        "total_buy_trades": sum(int(row.get("trades") or 0) for row in totals),
+        "open_trades": open_trades,
+        "closed_trades": closed_trades,
+        "winning_trades": winning_trades,
+        "winning_pct": round(winning_trades / considered * 100, 2) if considered > 0 else 0,
+        "quotes_as_of": quotes_as_of if status != "closed" else None
+    }
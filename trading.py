@@ -1,9 +1,32 @@
-import yfinance as yf
-import pandas as pd
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dateutil.parser import parse as parse_datetime
 from supabase import create_client, Client
-import pytz
+from market_data import fetch_ohlcv, fetch_ohlcv_batch
+from market_snapshot import SNAPSHOT_PERIOD, MarketSnapshot
+from universe_metadata import UniverseMetadata
+from position_book import position_book
+from quote_service import quote_service
+from exit_engine import evaluate_strategy_exits
+from unit_of_work import TradeUnitOfWork
+from portfolio_summary import load_portfolio_totals
+from write_queue import write_queue
+from ticker_locks import ticker_locks
+from trading_calendar import is_trading_window, session_state
+from trade_ledger import (
+    POSITION_COLUMNS,
+    InvalidPageRequest,
+    build_summary,
+    decode_cursor,
+    encode_cursor,
+    oldest_quote,
+    page_positions,
+    position_totals,
+    positions_from_trades,
+    sort_column_for,
+    value_position
+)
 
 from indicators import (
     calculate_additional_indicators,
@@ -18,24 +41,58 @@ from indicators import (
 # Initialize Supabase
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+TRADING_WORKERS = int(os.getenv("TRADING_WORKERS", "8"))
+
 def get_last_trade(ticker):
     response = supabase.table("trades").select("*").eq("ticker", ticker).order("timestamp", desc=True).limit(1).execute()
     if response.data:
         return response.data[0]
     return None
 
-def get_current_price(ticker):
-    df = yf.download(ticker, period="1d", interval="1d", progress=False)
-    if df.empty:
+LAST_TRADES_PAGE_SIZE = 1000
+
+def get_last_trades():
+    """
+    Latest trade per ticker for the whole universe from the latest_trades view,
+    as {ticker: trade}; None if the view cannot be read
+    """
+    last_trades = {}
+    try:
+        start = 0
+        while True:
+            # A stable order keeps pages from overlapping or skipping tickers
+            response = supabase.table("latest_trades").select("*").order("ticker") \
+                .range(start, start + LAST_TRADES_PAGE_SIZE - 1).execute()
+            for trade in response.data:
+                last_trades[trade["ticker"]] = trade
+            if len(response.data) < LAST_TRADES_PAGE_SIZE:
+                break
+            start += LAST_TRADES_PAGE_SIZE
+    except Exception as e:
+        print(f"⚠️ Could not prefetch last trades, falling back to per-ticker lookups: {e}")
         return None
-    return float(df["Close"].iloc[-1])
+    print(f"📒 Prefetched last trades for {len(last_trades)} tickers")
+    return last_trades
+
+def get_current_price(ticker):
+    return quote_service.get_quote(ticker)
 
 def is_market_closed():
-    india_tz = pytz.timezone("Asia/Kolkata")
-    now_ist = datetime.now(india_tz)
-    return now_ist.hour > 15 or (now_ist.hour == 15 and now_ist.minute > 15)
+    """Outside the NSE session (weekends, holidays) or past the 15:15 trading cutoff"""
+    return not is_trading_window()
+
+def _writer(uow):
+    """The run's unit of work, or a one-shot writer that flushes immediately"""
+    return uow or TradeUnitOfWork(flush_every=1, client=supabase)
+
+def _notify(message, uow, keys=()):
+    """Alerts wait in the run's unit of work until the write they report has been applied"""
+    if uow:
+        uow.notify(message, keys)
+    else:
+        send_telegram(message)  # The one-shot writer has already flushed
 
-def execute_buy_trade(ticker, price, quantity, total_invested, reason, score, ml_prob, regime, indicators, reasoning, sl, t1, t2, t3):
+def execute_buy_trade(ticker, price, quantity, total_invested, reason, score, ml_prob, regime, indicators, reasoning, sl, t1, t2, t3, uow=None):
     trade = {
         "ticker": ticker,
         "action": "BUY",
@@ -56,10 +113,10 @@ def execute_buy_trade(ticker, price, quantity, total_invested, reason, score, ml
         "entry_date": datetime.utcnow().isoformat(),
         "reason": reason
     }
-    supabase.table("trades").insert(trade).execute()
-    send_telegram(f"🟢 *BUY EXECUTED* for `{ticker}`\n📈 Price: ₹{price:.2f}\n📦 Qty: {quantity}\n💰 Total: ₹{total_invested}\n📝 Reason: {reason}")
+    _writer(uow).insert(trade)
+    _notify(f"🟢 *BUY EXECUTED* for `{ticker}`\n📈 Price: ₹{price:.2f}\n📦 Qty: {quantity}\n💰 Total: ₹{total_invested}\n📝 Reason: {reason}", uow, keys=[f"ticker:{ticker}"])
 
-def execute_sell_trade(trade_id, ticker, buy_price, current_price, quantity, reason_text, entry_date):
+def execute_sell_trade(trade_id, ticker, buy_price, current_price, quantity, reason_text, entry_date, uow=None):
     pnl = (current_price - buy_price) * quantity
     pnl_percent = (pnl / (buy_price * quantity)) * 100
     days_held = (datetime.utcnow() - parse_datetime(entry_date)).days
@@ -78,26 +135,96 @@ def execute_sell_trade(trade_id, ticker, buy_price, current_price, quantity, rea
         "last_updated": datetime.utcnow().isoformat()
     }
 
-    supabase.table("trades").update(update_fields).eq("id", trade_id).execute()
-    send_telegram(f"🔴 *SELL EXECUTED* for `{ticker}`\n📉 Price: ₹{current_price:.2f}\n💰 PnL: ₹{pnl:.2f} ({pnl_percent:.2f}%)\n📅 Days Held: {days_held}\n📝 Reason: {reason_text}")
+    _writer(uow).update(trade_id, update_fields)
+    _notify(f"🔴 *SELL EXECUTED* for `{ticker}`\n📉 Price: ₹{current_price:.2f}\n💰 PnL: ₹{pnl:.2f} ({pnl_percent:.2f}%)\n📅 Days Held: {days_held}\n📝 Reason: {reason_text}", uow, keys=[f"trade:{trade_id}"])
+
+def exit_input_row(trade, latest):
+    """Exit engine inputs for an open trade and its latest indicator bar"""
+    return {
+        "id": trade["id"],
+        "ticker": trade["ticker"],
+        "trade": trade,
+        "entry": float(trade["price"]),
+        "stop": trade.get("stop_loss"),
+        "target_1": trade.get("target_1"),
+        "target_2": trade.get("target_2"),
+        "target_3": trade.get("target_3"),
+        "close": latest['Close'],
+        "rsi": latest['RSI'],
+        "macd": latest['MACD'],
+        "signal": latest['Signal'],
+        "ema_20": latest['EMA_20'],
+        "ema_50": latest['EMA_50'],
+        "atr": latest.get("ATR", 0)
+    }
 
-def analyze_for_trading(ticker, market_regime="NEUTRAL"):
+def _apply_exit(row, action, uow=None):
+    ticker = row["ticker"]
+    trade = row["trade"]
+    try:
+        if action["action"] in ("extend", "sell") and position_book.get(trade["id"]) is None:
+            # Closed by another runner (e.g. PositionManager) since it was priced
+            print(f"ℹ️ {ticker} position {trade['id']} is no longer open — skipping exit")
+        elif action["action"] == "skip":
+            if action["reason"] == "no price":
+                print(f"❌ Could not fetch fresh price for SELL: {ticker}")
+            else:
+                print(f"❌ SELL price variation > 50% — skipping {ticker}")
+        elif action["action"] == "extend":
+            extended = {k: float(v) for k, v in action["fields"].items()}
+            _writer(uow).update(trade["id"], extended)
+            print(f"📈 Extending targets for {ticker} → T3: ₹{extended['target_3']}, T4: ₹{action['next_target']}")
+        elif action["action"] == "hold":
+            print(f"🟡 Holding {ticker} — No exit conditions met.")
+        else:
+            current_price = float(action["price"])
+            quantity = int(trade.get("quantity", 1))
+            entry_date = trade.get("entry_date") or trade.get("timestamp")
+            print(f"➡️ Executing SELL: {ticker} at ₹{current_price} | Qty: {quantity} | Reason: {action['reason']}")
+            execute_sell_trade(trade["id"], ticker, row["entry"], current_price, quantity, action["reason"], entry_date, uow=uow)
+    except Exception as e:
+        print(f"❌ Error applying exit for {ticker}: {e}")
+
+def process_exits(rows, uow=None):
+    """
+    Price every open position with one batched quote call, evaluate the exit
+    rules for all of them in one vectorized pass and apply the actions
+    """
+    if not rows:
+        return []
+    quotes = quote_service.get_quotes(row["ticker"] for row in rows)
+    for row in rows:
+        row["price"] = quotes.get(row["ticker"])
+
+    actions = evaluate_strategy_exits(rows)
+    for row, action in zip(rows, actions):
+        with ticker_locks.hold(row["ticker"]):
+            _apply_exit(row, action, uow)
+    return actions
+
+def analyze_for_trading(ticker, market_regime="NEUTRAL", daily_df=None, last_trades=None, exit_rows=None, uow=None):
+    """
+    daily_df: SNAPSHOT_PERIOD of daily OHLCV from the market snapshot or the
+    run's batched download; when given, no history is downloaded. The weekly
+    frame is always resampled from it, so a snapshot hit and a miss score alike.
+    last_trades: prefetched {ticker: latest trade} from get_last_trades.
+    exit_rows: when given, open positions are collected here for a batched
+    exit pass instead of being evaluated immediately.
+    uow: TradeUnitOfWork collecting this run's writes.
+    """
     print(f"\n🤖 Trading Analysis: {ticker}")
     if is_market_closed():
         print("⏰ Market closed — skipping trade for", ticker)
         return
 
     try:
-        df = yf.download(ticker, period="3mo", interval="1d", progress=False)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-        df.columns.name = None
-        df = df[['Open', 'High', 'Low', 'Close', 'Volume']].dropna().astype(float)
-        if df.empty or len(df) < 50:
+        if daily_df is None:
+            daily_df = fetch_ohlcv(ticker, period=SNAPSHOT_PERIOD)
+        if daily_df.empty or len(daily_df) < 50:
             print("⚠️ Missing data or not enough candles.")
             return
 
-        df = calculate_additional_indicators(df)
+        df = calculate_additional_indicators(daily_df.copy())
         df.dropna(inplace=True)
         df['Candle'] = "None"
         df.at[df.index[-1], 'Candle'] = detect_candle_pattern(df)
@@ -105,7 +232,13 @@ def analyze_for_trading(ticker, market_regime="NEUTRAL"):
         latest = df.iloc[-1]
         previous = df.iloc[-2]
 
-        df_weekly = yf.download(ticker, interval="1wk", period="6mo", progress=False)
+        df_weekly = daily_df.resample('W').agg({
+            'Open': 'first',
+            'High': 'max',
+            'Low': 'min',
+            'Close': 'last',
+            'Volume': 'sum'
+        }).dropna()
         if not df_weekly.empty:
             df_weekly = calculate_additional_indicators(df_weekly)
 
@@ -115,184 +248,204 @@ def analyze_for_trading(ticker, market_regime="NEUTRAL"):
         dynamic_threshold = get_dynamic_score_threshold(market_regime)
         print(f"🧠 {ticker} Score: {score:.2f} | Threshold: {dynamic_threshold}")
 
-        last_trade = get_last_trade(ticker)
-
-        if not last_trade or last_trade['status'].lower() == "closed":
-            if score >= dynamic_threshold:
-                latest_price = float(latest['Close'])
-                current_price = get_current_price(ticker)
-                if not current_price:
-                    print("❌ Could not fetch fresh price.")
-                    return
-                price_diff_pct = abs(latest_price - current_price) / latest_price * 100
-                if price_diff_pct > 5:
-                    print(f"❌ BUY price deviation too high: {price_diff_pct:.2f}% — skipping {ticker}")
-                    return
-
-                MAX_INVEST_PER_TRADE = 5000
-                quantity = max(1, int(MAX_INVEST_PER_TRADE // current_price))
-                total_invested = round(quantity * current_price, 2)
-                reason = f"Score {score} ≥ {dynamic_threshold} | Pattern: {latest['Candle']}"
-                atr = latest['ATR']
-                stop_loss = round(current_price - 1.2 * atr, 2)
-                target_1 = round(current_price + 1.5 * atr, 2)
-                target_2 = round(current_price + 2.0 * atr, 2)
-                target_3 = round(current_price + 3.0 * atr, 2)
-
-                print(f"➡️ Executing BUY: {ticker} at ₹{current_price} | Qty: {quantity}")
-                execute_buy_trade(
-                    ticker, current_price, quantity, total_invested,
-                    reason, score, latest.get("ML_Prob"), market_regime,
-                    matched_indicators, reasoning, stop_loss, target_1, target_2, target_3
-                )
-
-        elif last_trade['status'].lower() == "open":
-            buy_price = float(last_trade['price'])
-            current_price = get_current_price(ticker)
-            if not current_price:
-                print("❌ Could not fetch fresh price for SELL.")
-                return
-
-            price_variation_pct = abs(current_price - buy_price) / buy_price * 100
-            if price_variation_pct > 50:
-                print(f"❌ SELL price variation > 50%: {price_variation_pct:.2f}% — skipping")
-                return
-
-            stop_loss = last_trade.get("stop_loss", buy_price * 0.97)
-            target_1 = last_trade.get("target_1")
-            target_2 = last_trade.get("target_2")
-            target_3 = last_trade.get("target_3")
-            atr = latest.get("ATR", 0)
-            entry_date = last_trade.get("entry_date") or last_trade.get("timestamp")
-
-            sell_reasons = []
-            if current_price <= stop_loss:
-                sell_reasons.append("Hit Stop Loss")
-
-            if target_3 and current_price >= target_3:
-                if latest['RSI'] < 55 or latest['MACD'] < latest['Signal'] or latest['Close'] < latest['EMA_20']:
-                    sell_reasons.append("Exiting after Target 3")
+        # Buys and sells for one symbol never interleave (see ticker_locks)
+        with ticker_locks.hold(ticker):
+            last_trade = last_trades.get(ticker) if last_trades is not None else get_last_trade(ticker)
+
+            if not last_trade or last_trade['status'].lower() == "closed":
+                if score >= dynamic_threshold:
+                    # last_trades predates the run: recheck for a buy made since
+                    # (another worker, ExecutionEngine, or one not yet flushed)
+                    if position_book.has_open_position(ticker) or f"ticker:{ticker}" in write_queue.pending_keys():
+                        print(f"⚠️ {ticker} already has an open or pending position — skipping BUY")
+                        return
+                    latest_price = float(latest['Close'])
+                    current_price = get_current_price(ticker)
+                    if not current_price:
+                        print("❌ Could not fetch fresh price.")
+                        return
+                    price_diff_pct = abs(latest_price - current_price) / latest_price * 100
+                    if price_diff_pct > 5:
+                        print(f"❌ BUY price deviation too high: {price_diff_pct:.2f}% — skipping {ticker}")
+                        return
+
+                    MAX_INVEST_PER_TRADE = 5000
+                    quantity = max(1, int(MAX_INVEST_PER_TRADE // current_price))
+                    total_invested = round(quantity * current_price, 2)
+                    reason = f"Score {score} ≥ {dynamic_threshold} | Pattern: {latest['Candle']}"
+                    atr = latest['ATR']
+                    stop_loss = round(current_price - 1.2 * atr, 2)
+                    target_1 = round(current_price + 1.5 * atr, 2)
+                    target_2 = round(current_price + 2.0 * atr, 2)
+                    target_3 = round(current_price + 3.0 * atr, 2)
+
+                    print(f"➡️ Executing BUY: {ticker} at ₹{current_price} | Qty: {quantity}")
+                    execute_buy_trade(
+                        ticker, current_price, quantity, total_invested,
+                        reason, score, latest.get("ML_Prob"), market_regime,
+                        matched_indicators, reasoning, stop_loss, target_1, target_2, target_3, uow=uow
+                    )
+
+            elif last_trade['status'].lower() == "open":
+                row = exit_input_row(last_trade, latest)
+                if exit_rows is not None:
+                    exit_rows.append(row)  # Evaluated with every other open position after the loop
                 else:
-                    new_target_4 = round(current_price + 1.5 * atr, 2)
-                    new_target_5 = round(current_price + 2.5 * atr, 2)
-                    supabase.table("trades").update({"target_2": target_3, "target_3": new_target_4}).eq("id", last_trade["id"]).execute()
-                    print(f"📈 Extending targets for {ticker} → T3: ₹{new_target_4}, T4: ₹{new_target_5}")
-                    return
-
-            elif target_2 and current_price >= target_2:
-                if latest['RSI'] < 55 or latest['MACD'] < latest['Signal']:
-                    sell_reasons.append("Exiting at Target 2 due to weakening")
-                else:
-                    return
-
-            elif target_1 and current_price >= target_1:
-                if latest['RSI'] < 50 or latest['MACD'] < latest['Signal'] or latest['Close'] < latest['EMA_50']:
-                    sell_reasons.append("Weakness at Target 1")
-                else:
-                    return
-
-            if not sell_reasons:
-                print("🟡 Holding — No exit conditions met.")
-                return
-
-            reason_text = ", ".join(sell_reasons)
-            quantity = int(last_trade.get("quantity", 1))
-            print(f"➡️ Executing SELL: {ticker} at ₹{current_price} | Qty: {quantity} | Reason: {reason_text}")
-            execute_sell_trade(last_trade["id"], ticker, buy_price, current_price, quantity, reason_text, entry_date)
+                    process_exits([row], uow=uow)
 
     except Exception as e:
         print(f"❌ Error in trading analysis for {ticker}: {e}")
+        raise  # Counted as an error by the run
 
-def get_trades_with_summary(status="open"):
-    response = supabase.table("trades").select("*").execute()
-    all_trades = response.data
-
-    processed = []
-    buy_trades = [t for t in all_trades if t["action"] == "BUY"]
-
-    for trade in buy_trades:
-        current_price = None
-        sell_price = None
-        sell_reason = None
-        sell_timestamp = None
-        days_held = None
-
-        sell = next(
-            (s for s in all_trades if s["action"] == "SELL" and s["ticker"] == trade["ticker"] and s["timestamp"] > trade["timestamp"]),
-            None
+def _trade_ticker(ticker, daily_frames, last_trades, exit_rows, uow, pending, job):
+    """One ticker of a trading run; returns its status entry, or None once cancelled"""
+    if job and job.cancelled:
+        return None
+    last_trade = (last_trades or {}).get(ticker)
+    if f"ticker:{ticker}" in pending or (last_trade and f"trade:{last_trade['id']}" in pending):
+        # Supabase does not reflect this ticker's last decision yet
+        print(f"⏳ Writes for {ticker} still queued — skipping this run")
+        if job:
+            job.tick()
+        return {"ticker": ticker, "status": "skipped - writes pending"}
+    try:
+        analyze_for_trading(
+            ticker, daily_df=daily_frames.get(ticker),
+            last_trades=last_trades, exit_rows=exit_rows, uow=uow
         )
+        if job:
+            job.tick()
+        return {"ticker": ticker, "status": "processed"}
+    except Exception as e:
+        if job:
+            job.tick(errors=1)
+        return {"ticker": ticker, "status": f"error - {str(e)}"}
+
+def run_trading_universe(tickers, job=None, workers=None):
+    """
+    Analyze every ticker on a pool of TRADING_WORKERS threads (Supabase reads
+    and scoring overlap), then run the batched exit pass. Results keep the
+    order of tickers. History the snapshot lacks is downloaded in batches
+    before the pool starts.
+    """
+    if job:
+        job.set_total(len(tickers))
 
-        if sell:
-            sell_price = float(sell["price"])
-            sell_reason = sell.get("reason")
-            sell_timestamp = sell.get("timestamp")
-            try:
-                buy_date = parse_datetime(trade["timestamp"])
-                sell_date = parse_datetime(sell_timestamp)
-            except Exception as e:
-                print(f"Invalid timestamp in {trade['ticker']}")
-                raise e
-
-            days_held = (sell_date - buy_date).days
-            trade["status"] = "CLOSED"
-        else:
-            current_price = get_current_price(trade["ticker"])
-            trade["status"] = "OPEN"
-
-        final_price = sell_price or current_price
-        if final_price:
-            quantity = trade.get("quantity", 1)
-            total_invested = trade.get("total_invested", float(trade["price"]) * quantity)
-            current_value = final_price * quantity
-            profit = current_value - total_invested
-            profit_pct = (profit / total_invested) * 100
-
-            processed.append({
-                **trade,
-                "sell_or_current_price": round(final_price, 2),
-                "current_value": round(current_value, 2),
-                "profit": round(profit, 2),
-                "profit_pct": round(profit_pct, 2),
-                "reason": sell_reason if trade["status"] == "CLOSED" else trade.get("reason"),
-                "sell_timestamp": sell_timestamp,
-                "days_held": days_held
-            })
-
-    if status in ["open", "closed"]:
-        filtered = [t for t in processed if t["status"].lower() == status.lower()]
-    else:
-        filtered = processed
-
-    filtered.sort(key=lambda x: x["sell_timestamp"] if status == "closed" else x["timestamp"], reverse=True)
-
-    summary = {
-        "total_invested": 0,
-        "current_value": 0,
-        "profit": 0,
-        "profit_pct": 0,
-        "total_buy_trades": len(buy_trades),
-        "open_trades": len([t for t in processed if t["status"] == "OPEN"]),
-        "closed_trades": len([t for t in processed if t["status"] == "CLOSED"]),
-        "winning_trades": 0,
-        "winning_pct": 0
+    if is_market_closed():
+        # Skip the session entirely: no snapshot, trade or quote reads
+        print(f"⏰ Market closed ({session_state()}) — skipping trading run")
+        if job:
+            job.tick(len(tickers))
+        return {
+            "message": "Market closed",
+            "results": [{"ticker": ticker, "status": "skipped - market closed"} for ticker in tickers]
+        }
+
+    # The screener's pre-filter never snapshots untradable tickers: drop them
+    # here too, keeping held ones so their exits are still evaluated
+    held = {position["ticker"] for position in position_book.open_positions()}
+    tradable = set(UniverseMetadata().tradable(tickers))
+    kept = [ticker for ticker in tickers if ticker in tradable or ticker in held]
+    prefiltered = len(tickers) - len(kept)
+    if job:
+        job.tick(prefiltered)
+    tickers = kept
+
+    # Reuse the screener's downloads while they are fresh
+    snapshot_frames = MarketSnapshot().load_fresh(tickers)
+    print(f"📸 Market snapshot covers {len(snapshot_frames)}/{len(tickers)} tickers")
+    # Same history as the snapshot, so a miss scores exactly like a hit
+    missing = [ticker for ticker in tickers if ticker not in snapshot_frames]
+    daily_frames = {**fetch_ohlcv_batch(missing, period=SNAPSHOT_PERIOD), **snapshot_frames}
+    last_trades = get_last_trades()
+    exit_rows = []
+    uow = TradeUnitOfWork(queue=write_queue)
+    pending = write_queue.pending_keys()
+
+    workers = max(1, workers or TRADING_WORKERS)
+    print(f"⚙️ Trading {len(tickers)} tickers on {workers} worker thread(s)")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="trade") as pool:
+        statuses = pool.map(
+            lambda ticker: _trade_ticker(ticker, daily_frames, last_trades, exit_rows, uow, pending, job),
+            tickers
+        )
+        results = [status for status in statuses if status is not None]
+
+    if not (job and job.cancelled):
+        process_exits(exit_rows, uow=uow)
+    uow.flush()
+
+    return {"message": "Trading logic executed", "results": results, "prefiltered": prefiltered, "writes": uow.stats}
+
+TRADES_PAGE_SIZE = 100
+MAX_TRADES_PAGE_SIZE = 1000
+
+def _fetch_position_page(status, limit, cursor):
+    """One page from the trade_positions view, filtered, projected and ordered in the query"""
+    sort_column = sort_column_for(status)
+    query = supabase.table("trade_positions").select(",".join(POSITION_COLUMNS))
+    if status in ("open", "closed"):
+        query = query.eq("position_status", status.upper())
+    if status == "closed":
+        query = query.not_.is_("sell_price", "null").not_.is_("sell_timestamp", "null")
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f'{sort_column}.lt."{sort_value}",and({sort_column}.eq."{sort_value}",id.lt.{int(row_id)})'
+        )
+    # One extra row tells whether another page follows
+    rows = query.order(sort_column, desc=True).order("id", desc=True).limit(limit + 1).execute().data
+    next_cursor = encode_cursor(rows[limit - 1], sort_column) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def get_trades_with_summary(status="open", limit=TRADES_PAGE_SIZE, cursor=None):
+    """
+    One page of valued positions (newest first) plus portfolio totals.
+    Filtering, projection, ordering and the cursor run in the query against
+    the trade_positions view; totals are the trigger-maintained
+    portfolio_summary row, with open positions from the position book
+    marked to market. Raises InvalidPageRequest for a bad cursor or limit.
+    """
+    if limit is None:
+        limit = TRADES_PAGE_SIZE
+    if limit < 1:
+        raise InvalidPageRequest("limit must be at least 1")
+    limit = min(limit, MAX_TRADES_PAGE_SIZE)
+    if cursor:
+        decode_cursor(cursor)  # Reject a bad cursor before any query runs
+    try:
+        page, next_cursor = _fetch_position_page(status, limit, cursor)
+        totals = load_portfolio_totals()
+        open_positions = [
+            {
+                "ticker": p["ticker"],
+                "quantity": p.get("quantity") or 1,
+                "total_invested": p.get("total_invested") or float(p["price"]) * (p.get("quantity") or 1)
+            }
+            for p in position_book.open_positions()
+        ]
+    except Exception as e:
+        print(f"⚠️ trade_positions view unavailable, pairing the full trades table instead: {e}")
+        positions = positions_from_trades(supabase.table("trades").select("*").execute().data)
+        page, next_cursor = page_positions(positions, status, limit, cursor)
+        totals = position_totals(positions)
+        open_positions = [p for p in positions if p["position_status"] == "OPEN"]
+
+    # Mark open positions to market with one batched, briefly cached quote
+    # download (the page's open rows are a subset of open_positions)
+    quotes = quote_service.get_quote_records(p["ticker"] for p in open_positions)
+    priced = [p for p in open_positions if quotes.get(p["ticker"], {}).get("price")]
+    open_values = [
+        (float(p["total_invested"]), quotes[p["ticker"]]["price"] * p["quantity"])
+        for p in priced
+    ]
+    quotes_as_of = oldest_quote(quotes[p["ticker"]]["quoted_at"] for p in priced)
+
+    trades = [
+        row for row in (value_position(p, quotes.get(p["ticker"])) for p in page) if row
+    ]
+    return {
+        "trades": trades,
+        "summary": build_summary(status, totals, open_values, quotes_as_of),
+        "next_cursor": next_cursor
     }
-
-    for t in filtered:
-        summary["total_invested"] += t.get("total_invested", float(t["price"]) * t.get("quantity", 1))
-        summary["current_value"] += t.get("current_value", t["sell_or_current_price"] * t.get("quantity", 1))
-        summary["profit"] += t["profit"]
-
-    filtered_winning_trades = [t for t in filtered if t["profit"] > 0]
-    summary["winning_trades"] = len(filtered_winning_trades)
-
-    total_considered = (
-        summary["open_trades"] if status == "open" else
-        summary["closed_trades"] if status == "closed" else
-        summary["open_trades"] + summary["closed_trades"]
-    )
-
-    summary["winning_pct"] = round((summary["winning_trades"] / total_considered) * 100, 2) if total_considered > 0 else 0
-
-    if summary["total_invested"] > 0:
-        summary["profit_pct"] = round((summary["profit"] / summary["total_invested"]) * 100, 2)
-
@@ -0,0 +1,163 @@
+import json
+import os
+from datetime import date, datetime, time, timedelta
+import pytz
+
+IST = pytz.timezone("Asia/Kolkata")
+
+# NSE equity sessions (IST)
+PRE_OPEN_START = time(9, 0)
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+TRADING_CUTOFF = time(15, 15)   # The bot stops opening / closing positions after this
+FINAL_AFTER = time(16, 0)       # Official closing prices are posted after the close; bars are final by this
+
+# NSE trading holidays falling on weekdays. Update from the exchange circular
+# each December, or point NSE_HOLIDAYS_FILE at a {"YYYY-MM-DD": "name"} JSON file.
+NSE_HOLIDAYS = {
+    "2025-02-26": "Mahashivratri",
+    "2025-03-14": "Holi",
+    "2025-03-31": "Id-Ul-Fitr (Ramadan Eid)",
+    "2025-04-10": "Shri Mahavir Jayanti",
+    "2025-04-14": "Dr. Baba Saheb Ambedkar Jayanti",
+    "2025-04-18": "Good Friday",
+    "2025-05-01": "Maharashtra Day",
+    "2025-08-15": "Independence Day",
+    "2025-08-27": "Shri Ganesh Chaturthi",
+    "2025-10-02": "Mahatma Gandhi Jayanti / Dussehra",
+    "2025-10-21": "Diwali Laxmi Pujan",
+    "2025-10-22": "Diwali Balipratipada",
+    "2025-11-05": "Prakash Gurpurb Sri Guru Nanak Dev",
+    "2025-12-25": "Christmas",
+    "2026-01-26": "Republic Day",
+    "2026-03-03": "Holi",
+    "2026-03-26": "Shri Ram Navami",
+    "2026-03-31": "Shri Mahavir Jayanti",
+    "2026-04-03": "Good Friday",
+    "2026-04-14": "Dr. Baba Saheb Ambedkar Jayanti",
+    "2026-05-01": "Maharashtra Day",
+    "2026-05-28": "Bakri Id",
+    "2026-06-26": "Muharram",
+    "2026-09-14": "Ganesh Chaturthi",
+    "2026-10-02": "Mahatma Gandhi Jayanti",
+    "2026-10-20": "Dussehra",
+    "2026-11-10": "Diwali Balipratipada",
+    "2026-11-24": "Prakash Gurpurb Sri Guru Nanak Dev",
+    "2026-12-25": "Christmas",
+}
+
+HOLIDAYS_FILE = os.getenv("NSE_HOLIDAYS_FILE")
+if HOLIDAYS_FILE and os.path.exists(HOLIDAYS_FILE):
+    with open(HOLIDAYS_FILE) as f:
+        NSE_HOLIDAYS.update(json.load(f))
+
+_HOLIDAY_DATES = {date.fromisoformat(d): name for d, name in NSE_HOLIDAYS.items()}
+HOLIDAYS_LISTED_THROUGH = max(d.year for d in _HOLIDAY_DATES)
+_warned_years = set()
+
+
+def now_ist():
+    return datetime.now(IST)
+
+
+def _as_ist(moment):
+    if moment is None:
+        return now_ist()
+    if moment.tzinfo is None:
+        return IST.localize(moment)
+    return moment.astimezone(IST)
+
+
+def _check_listed(day):
+    """Warn (once per year) when the holiday table does not cover day"""
+    if day.year > HOLIDAYS_LISTED_THROUGH and day.year not in _warned_years:
+        _warned_years.add(day.year)
+        print(f"⚠️ NSE holidays are only listed through {HOLIDAYS_LISTED_THROUGH}: every weekday "
+              f"of {day.year} counts as a trading day until NSE_HOLIDAYS is updated")
+
+
+def holiday_name(day):
+    _check_listed(day)
+    return _HOLIDAY_DATES.get(day)
+
+
+def is_trading_day(day):
+    _check_listed(day)
+    return day.weekday() < 5 and day not in _HOLIDAY_DATES
+
+
+def previous_trading_day(day):
+    day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def session_state(moment=None):
+    """
+    "holiday" | "weekend" | "pre_market" | "pre_open" | "open" | "post_close"
+    """
+    moment = _as_ist(moment)
+    day, clock = moment.date(), moment.time()
+    if holiday_name(day):
+        return "holiday"
+    if day.weekday() >= 5:
+        return "weekend"
+    if clock < PRE_OPEN_START:
+        return "pre_market"
+    if clock < MARKET_OPEN:
+        return "pre_open"
+    if clock < MARKET_CLOSE:
+        return "open"
+    return "post_close"
+
+
+def is_market_open(moment=None):
+    return session_state(moment) == "open"
+
+
+def is_trading_window(moment=None):
+    """Market open and before the bot's TRADING_CUTOFF"""
+    moment = _as_ist(moment)
+    return is_market_open(moment) and moment.time() <= TRADING_CUTOFF
+
+
+def latest_session_date(moment=None):
+    """
+    Date of the newest daily bar: today once the session has opened,
+    otherwise the previous trading day
+    """
+    moment = _as_ist(moment)
+    day = moment.date()
+    if is_trading_day(day) and moment.time() >= MARKET_OPEN:
+        return day
+    return previous_trading_day(day)
+
+
+def last_final(moment=None):
+    """
+    IST datetime from which the latest session's bars are final (FINAL_AFTER
+    on that day), or None from the open until FINAL_AFTER while they can change
+    """
+    moment = _as_ist(moment)
+    day = moment.date()
+    if is_trading_day(day) and moment.time() >= MARKET_OPEN:
+        if moment.time() < FINAL_AFTER:
+            return None
+    else:
+        day = previous_trading_day(day)
+    return IST.localize(datetime.combine(day, FINAL_AFTER))
+
+
+def unchanged_since(fetched_at, moment=None):
+    """
+    True when no bar can have changed since fetched_at (a timezone-aware
+    datetime or epoch seconds): it was fetched once the latest session's
+    bars were final and the next session has not opened
+    """
+    final = last_final(moment)
+    if final is None:
+        return False
+    if isinstance(fetched_at, (int, float)):
+        fetched_at = datetime.fromtimestamp(fetched_at, IST)
+    return _as_ist(fetched_at) >= final
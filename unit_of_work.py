@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+import uuid
+from supabase import create_client, Client
+from indicators import SUPABASE_URL, SUPABASE_KEY, send_telegram
+from position_book import position_book
+
+BULK_CHUNK_SIZE = 500
+FLUSH_EVERY = 50  # Pending writes that trigger an automatic flush mid-run
+
+
+def insert_once(client, table, rows):
+    """
+    Insert rows keyed by their client-side order_id (unique in supabase.sql),
+    so retrying a write that landed but timed out adds nothing twice.
+    Returns the rows inserted now.
+    """
+    if all(row.get("order_id") for row in rows):
+        return client.table(table).upsert(rows, on_conflict="order_id", ignore_duplicates=True).execute().data or []
+    return client.table(table).insert(rows).execute().data or []
+
+
+def bulk_update(client, table, updates):
+    """
+    Apply {id: fields} as UPDATEs; for trades, one bulk_update_trades RPC
+    (supabase.sql) per chunk. Never INSERT ... ON CONFLICT: that checks NOT
+    NULL on the partial row and re-creates rows deleted meanwhile. Otherwise
+    rows with identical fields share one .update().in_("id", ...) request.
+    Returns the number of requests made.
+    """
+    rows = [{"id": row_id, **fields} for row_id, fields in updates.items()]
+    requests = 0
+    if table == "trades":
+        try:
+            for start in range(0, len(rows), BULK_CHUNK_SIZE):
+                client.rpc("bulk_update_trades", {"updates": rows[start:start + BULK_CHUNK_SIZE]}).execute()
+                requests += 1
+            return requests
+        except Exception as e:
+            # Updates are idempotent, so re-applying chunks that landed is harmless
+            print(f"⚠️ bulk_update_trades RPC unavailable, updating rows with identical fields together: {e}")
+
+    by_fields = {}
+    for row_id, fields in updates.items():
+        key = json.dumps(fields, sort_keys=True, default=str)
+        by_fields.setdefault(key, (fields, []))[1].append(row_id)
+    for fields, ids in by_fields.values():
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            client.table(table).update(fields).in_("id", ids[start:start + BULK_CHUNK_SIZE]).execute()
+            requests += 1
+    return requests
+
+
+class TradeUnitOfWork:
+    """
+    Collects trade inserts, updates and their Telegram alerts during a run
+    and flushes them as bulk inserts and bulk updates keyed by id; alerts go
+    out only once the writes before them have landed. The position book
+    follows once the writes are applied (or queued). With a write queue,
+    flushing hands the bulk writes to its drainer instead of waiting on
+    Supabase.
+    """
+    def __init__(self, flush_every=FLUSH_EVERY, table="trades", client=None, queue=None):
+        self.queue = queue
+        self.supabase: Client = client or (None if queue else create_client(SUPABASE_URL, SUPABASE_KEY))
+        self.table = table
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._inserts = []
+        self._updates = {}  # id -> merged fields, in first-touch order
+        self._messages = []  # (message, keys) sent after the writes queued before them
+        self.stats = {"flushes": 0, "inserted": 0, "updated": 0, "flush_ms": 0.0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._inserts) + len(self._updates)
+
+    def insert(self, row):
+        if not row.get("order_id"):
+            row = {**row, "order_id": uuid.uuid4().hex}  # Idempotency key for retried flushes
+        if row.get("action") == "BUY":
+            # Visible to has_open_position until it is written or queued
+            position_book.reserve_buy(row["ticker"], row)
+        with self._lock:
+            self._inserts.append(row)
+        self._maybe_flush()
+
+    def update(self, row_id, fields):
+        with self._lock:
+            self._updates.setdefault(row_id, {}).update(fields)
+        self._maybe_flush()
+
+    def notify(self, message, keys=()):
+        """Telegram alert for writes buffered so far; sent once they are applied"""
+        with self._lock:
+            self._messages.append((message, list(keys)))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self.pending() >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Write everything pending; returns the inserted rows. On failure the
+        writes not yet applied are put back for the next flush and the
+        error is raised.
+        """
+        with self._lock:
+            inserts, self._inserts = self._inserts, []
+            updates, self._updates = self._updates, {}
+            messages, self._messages = self._messages, []
+        if not inserts and not updates and not messages:
+            return []
+
+        if self.queue:
+            return self._enqueue(inserts, updates, messages)
+
+        started = time.perf_counter()
+        inserted, written = [], 0
+        try:
+            for start in range(0, len(inserts), BULK_CHUNK_SIZE):
+                chunk = inserts[start:start + BULK_CHUNK_SIZE]
+                rows = insert_once(self.supabase, self.table, chunk)
+                written += len(chunk)
+                for row in rows:
+                    position_book.record_buy(row)
+                if len(rows) < len(chunk):
+                    position_book.invalidate()  # Some landed on an earlier attempt; reload them
+                inserted.extend(rows)
+                self._release_buys(chunk)
+            requests = bulk_update(self.supabase, self.table, updates) if updates else 0
+        except Exception:
+            self._restore(inserts[written:], updates, messages)
+            raise
+        self._record_updates(updates)
+
+        for message, _ in messages:
+            send_telegram(message)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["inserted"] += len(inserts)
+        self.stats["updated"] += len(updates)
+        self.stats["flush_ms"] += elapsed_ms
+        print(f"💾 Flushed {len(inserts)} inserts + {len(updates)} updates in "
+              f"{requests + (len(inserts) + BULK_CHUNK_SIZE - 1) // BULK_CHUNK_SIZE} requests ({elapsed_ms:.0f} ms)")
+        return inserted
+
+    def _restore(self, inserts, updates, messages):
+        """Put back what a failed flush did not apply, ahead of anything buffered since"""
+        with self._lock:
+            self._inserts = inserts + self._inserts
+            merged = {row_id: dict(fields) for row_id, fields in updates.items()}
+            for row_id, fields in self._updates.items():
+                merged.setdefault(row_id, {}).update(fields)
+            self._updates = merged
+            self._messages = messages + self._messages
+        print(f"⚠️ Flush failed — {len(inserts)} inserts + {len(updates)} updates kept for the next flush")
+
+    @staticmethod
+    def _record_updates(updates):
+        for row_id, fields in updates.items():
+            position_book.record_update(row_id, fields)
+
+    @staticmethod
+    def _release_buys(inserts):
+        for row in inserts:
+            if row.get("action") == "BUY":
+                position_book.release_buy(row["ticker"])
+
+    def _enqueue(self, inserts, updates, messages):
+        # The drainer adds inserted trades to the position book once they land
+        started = time.perf_counter()
+        queued, enqueued = 0, 0
+        try:
+            for start in range(0, len(inserts), BULK_CHUNK_SIZE):
+                chunk = inserts[start:start + BULK_CHUNK_SIZE]
+                self.queue.insert(self.table, chunk, keys=[f"ticker:{row.get('ticker')}" for row in chunk])
+                queued += len(chunk)
+                enqueued += 1
+                # The queue holds its own reservation for these buys until they land
+                self._release_buys(chunk)
+            update_rows = [{"id": row_id, **fields} for row_id, fields in updates.items()]
+            for start in range(0, len(update_rows), BULK_CHUNK_SIZE):
+                chunk = update_rows[start:start + BULK_CHUNK_SIZE]
+                self.queue.update(self.table, chunk, keys=[f"trade:{row['id']}" for row in chunk])
+                enqueued += 1
+        except Exception:
+            # Updates are idempotent; only inserts already queued must not be queued twice
+            self._restore(inserts[queued:], updates, messages)
+            raise
+        self._record_updates(updates)
+        # Sharing the writes' keys, each alert waits for its write to land
+        for message, keys in messages:
+            self.queue.telegram(message, keys=keys)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats["flushes"] += 1
+        self.stats["inserted"] += len(inserts)
+        self.stats["updated"] += len(updates)
+        self.stats["flush_ms"] += elapsed_ms
+        print(f"📤 Enqueued {len(inserts)} inserts + {len(updates)} updates for write-behind in "
+              f"{enqueued} queue writes + {len(messages)} alerts ({elapsed_ms:.0f} ms)")
+        return []
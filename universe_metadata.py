@@ -0,0 +1,128 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from local_store import connect
+from market_data import fetch_ohlcv_batch
+
+METADATA_DB = "universe_metadata.db"
+METADATA_PERIOD = "6mo"       # Same history the screener scores on
+METADATA_MAX_AGE_HOURS = 36   # Refreshed nightly; older metadata is still used but reported
+MIN_AVG_VOLUME = 100000       # ExecutionEngine.min_liquidity
+MIN_PRICE = float(os.getenv("UNIVERSE_MIN_PRICE", "10"))
+MIN_BARS = 50                 # Screeners need 50 daily bars
+
+
+class UniverseMetadata:
+    """
+    Cached per-ticker average volume, last price and data availability, used
+    to drop tickers that can never be traded before downloading them
+    """
+    def __init__(self, db_name=METADATA_DB):
+        self._lock = threading.Lock()
+        self.conn = connect(db_name)
+        self.conn.execute("""
+            create table if not exists universe_metadata (
+                ticker text primary key,
+                avg_volume real,
+                last_price real,
+                bars integer not null,
+                last_bar text,
+                refreshed_at text not null
+            )
+        """)
+        self.conn.commit()
+
+    def refresh(self, tickers, period=METADATA_PERIOD, job=None):
+        """
+        Re-download the universe in batches and rebuild its metadata
+        """
+        tickers = list(tickers)
+        if job:
+            job.set_total(len(tickers))
+
+        now = datetime.utcnow().isoformat()
+        rows, missing = [], 0
+        for start in range(0, len(tickers), 500):
+            if job and job.cancelled:
+                break
+            chunk = tickers[start:start + 500]
+            frames = fetch_ohlcv_batch(chunk, period=period)
+            for ticker in chunk:
+                df = frames.get(ticker)
+                if df is None or df.empty:
+                    # fetch_ohlcv_batch drops a whole failed chunk: keep the
+                    # previous row (or none, which tradable() keeps) rather
+                    # than marking the ticker as having no data
+                    missing += 1
+                    continue
+                rows.append((
+                    ticker,
+                    float(df['Volume'].tail(20).mean()),
+                    float(df['Close'].iloc[-1]),
+                    len(df),
+                    str(df.index[-1]),
+                    now
+                ))
+            if job:
+                job.tick(len(chunk))
+
+        with self._lock:
+            self.conn.executemany(
+                "insert or replace into universe_metadata values (?, ?, ?, ?, ?, ?)", rows
+            )
+            self.conn.commit()
+        print(f"🗂️ Universe metadata refreshed for {len(rows)} tickers ({missing} without data kept as before)")
+        return {"refreshed": len(rows), "missing": missing, "refreshed_at": now}
+
+    def load(self, tickers):
+        tickers = list(tickers)
+        metadata = {}
+        with self._lock:
+            for start in range(0, len(tickers), 500):
+                chunk = tickers[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"select * from universe_metadata where ticker in ({placeholders})", chunk
+                ).fetchall()
+                metadata.update({row["ticker"]: dict(row) for row in rows})
+        return metadata
+
+    def last_refreshed(self):
+        row = self.conn.execute("select max(refreshed_at) as refreshed_at from universe_metadata").fetchone()
+        return row["refreshed_at"] if row else None
+
+    def tradable(self, tickers, min_avg_volume=MIN_AVG_VOLUME, min_price=MIN_PRICE, min_bars=MIN_BARS):
+        """
+        Tickers worth screening. Tickers without metadata are kept, so an empty
+        or partial cache never hides new listings.
+        """
+        tickers = list(tickers)
+        refreshed_at = self.last_refreshed()
+        if not refreshed_at:
+            print("⚠️ No universe metadata yet — screening the full universe")
+            return tickers
+        if datetime.fromisoformat(refreshed_at) < datetime.utcnow() - timedelta(hours=METADATA_MAX_AGE_HOURS):
+            print(f"⚠️ Universe metadata is stale (refreshed {refreshed_at})")
+
+        metadata = self.load(tickers)
+        kept = []
+        for ticker in tickers:
+            meta = metadata.get(ticker)
+            if meta is None:
+                kept.append(ticker)
+            elif (meta["bars"] >= min_bars
+                  and meta["avg_volume"] >= min_avg_volume
+                  and meta["last_price"] >= min_price):
+                kept.append(ticker)
+
+        print(f"🗂️ Universe pre-filter: {len(kept)}/{len(tickers)} tickers are liquid enough to screen")
+        return kept
+
+
+def refresh_universe_metadata(job=None):
+    from screener import fetch_nifty_stocks
+    return UniverseMetadata().refresh(fetch_nifty_stocks(), job=job)
+
+
+if __name__ == "__main__":
+    refresh_universe_metadata()
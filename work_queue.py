@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from local_store import connect
+
+# Workers share it on one host only: SQLite WAL (local_store.connect) needs local disk and
+# does not lock across machines or network filesystems
+WORK_QUEUE_DB = os.getenv("WORK_QUEUE_DB", "work_queue.db")
+SHARD_SIZE = 50
+LEASE_SECONDS = 300       # A shard whose worker stops heartbeating is re-queued after this
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5
+
+
+def _now():
+    return datetime.utcnow()
+
+
+class WorkQueue:
+    """
+    SQLite-backed shard queue for the screener: the coordinator enqueues
+    shards, workers claim them under a lease and post back their matches
+    """
+    def __init__(self, db_name=WORK_QUEUE_DB):
+        self.conn = connect(db_name)
+        self.conn.executescript("""
+            create table if not exists queue_runs (
+                run_id text primary key,
+                status text not null,
+                total_shards integer not null,
+                created_at text not null,
+                finished_at text,
+                batch_id integer
+            );
+            create table if not exists queue_shards (
+                run_id text not null,
+                shard_no integer not null,
+                tickers_json text not null,
+                status text not null,
+                worker_id text,
+                lease_expires text,
+                attempts integer not null default 0,
+                result_json text,
+                error text,
+                primary key (run_id, shard_no)
+            );
+            create index if not exists queue_shards_status_idx on queue_shards (status, lease_expires);
+        """)
+        self.conn.commit()
+
+    def enqueue_run(self, tickers, shard_size=SHARD_SIZE):
+        run_id = uuid.uuid4().hex[:12]
+        shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+        with self.conn:
+            self.conn.execute(
+                "insert into queue_runs (run_id, status, total_shards, created_at) values (?, 'running', ?, ?)",
+                (run_id, len(shards), _now().isoformat())
+            )
+            self.conn.executemany(
+                "insert into queue_shards (run_id, shard_no, tickers_json, status) values (?, ?, ?, 'queued')",
+                [(run_id, i, json.dumps(shard)) for i, shard in enumerate(shards)]
+            )
+        print(f"📬 Enqueued run {run_id}: {len(tickers)} tickers in {len(shards)} shards")
+        return run_id
+
+    def requeue_expired(self):
+        """Give shards held by dead workers back to the queue (or fail them after MAX_ATTEMPTS)"""
+        now = _now().isoformat()
+        with self.conn:
+            self.conn.execute(
+                "update queue_shards set status = 'failed', error = 'lease expired too often' "
+                "where status = 'claimed' and lease_expires < ? and attempts >= ?",
+                (now, MAX_ATTEMPTS)
+            )
+            cur = self.conn.execute(
+                "update queue_shards set status = 'queued', worker_id = null, lease_expires = null "
+                "where status = 'claimed' and lease_expires < ?",
+                (now,)
+            )
+        if cur.rowcount:
+            print(f"♻️ Re-queued {cur.rowcount} shard(s) from dead workers")
+        return cur.rowcount
+
+    def claim(self, worker_id, run_id=None):
+        """Atomically claim the next queued shard; returns (run_id, shard_no, tickers) or None"""
+        self.requeue_expired()
+        lease = (_now() + timedelta(seconds=LEASE_SECONDS)).isoformat()
+        self.conn.execute("begin immediate")
+        try:
+            query = "select run_id, shard_no, tickers_json from queue_shards where status = 'queued'"
+            params = []
+            if run_id:
+                query += " and run_id = ?"
+                params.append(run_id)
+            row = self.conn.execute(query + " order by run_id, shard_no limit 1", params).fetchone()
+            if not row:
+                self.conn.execute("commit")
+                return None
+            self.conn.execute(
+                "update queue_shards set status = 'claimed', worker_id = ?, lease_expires = ?, "
+                "attempts = attempts + 1 where run_id = ? and shard_no = ?",
+                (worker_id, lease, row["run_id"], row["shard_no"])
+            )
+            self.conn.execute("commit")
+        except Exception:
+            self.conn.execute("rollback")
+            raise
+        return row["run_id"], row["shard_no"], json.loads(row["tickers_json"])
+
+    def heartbeat(self, run_id, shard_no, worker_id):
+        lease = (_now() + timedelta(seconds=LEASE_SECONDS)).isoformat()
+        with self.conn:
+            self.conn.execute(
+                "update queue_shards set lease_expires = ? where run_id = ? and shard_no = ? and worker_id = ?",
+                (lease, run_id, shard_no, worker_id)
+            )
+
+    def complete(self, run_id, shard_no, worker_id, matches):
+        with self.conn:
+            cur = self.conn.execute(
+                "update queue_shards set status = 'done', result_json = ?, lease_expires = null "
+                "where run_id = ? and shard_no = ? and worker_id = ? and status = 'claimed'",
+                (json.dumps(matches, default=str), run_id, shard_no, worker_id)
+            )
+        return cur.rowcount == 1
+
+    def progress(self, run_id):
+        rows = self.conn.execute(
+            "select status, count(*) as n from queue_shards where run_id = ? group by status", (run_id,)
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def done_tickers(self, run_id):
+        """Tickers in the run's completed shards"""
+        row = self.conn.execute(
+            "select coalesce(sum(json_array_length(tickers_json)), 0) as n from queue_shards "
+            "where run_id = ? and status = 'done'",
+            (run_id,)
+        ).fetchone()
+        return row["n"]
+
+    def has_open_shards(self, run_id=None):
+        query = "select 1 from queue_shards where status in ('queued', 'claimed')"
+        params = []
+        if run_id:
+            query += " and run_id = ?"
+            params.append(run_id)
+        return self.conn.execute(query + " limit 1", params).fetchone() is not None
+
+    def merged_matches(self, run_id):
+        rows = self.conn.execute(
+            "select result_json from queue_shards where run_id = ? and status = 'done' order by shard_no",
+            (run_id,)
+        ).fetchall()
+        return [stock for row in rows for stock in json.loads(row["result_json"])]
+
+    def failed_tickers(self, run_id):
+        rows = self.conn.execute(
+            "select tickers_json from queue_shards where run_id = ? and status = 'failed' order by shard_no",
+            (run_id,)
+        ).fetchall()
+        return [ticker for row in rows for ticker in json.loads(row["tickers_json"])]
+
+    def fail_run(self, run_id):
+        with self.conn:
+            self.conn.execute(
+                "update queue_runs set status = 'failed', finished_at = ? where run_id = ?",
+                (_now().isoformat(), run_id)
+            )
+
+    def finish_run(self, run_id, batch_id=None):
+        with self.conn:
+            self.conn.execute(
+                "update queue_runs set status = 'completed', finished_at = ?, batch_id = ? where run_id = ?",
+                (_now().isoformat(), batch_id, run_id)
+            )
+
+
+def run_worker(worker_id=None, db_name=WORK_QUEUE_DB, run_id=None, exit_when_idle=True):
+    """
+    Claim shards until the queue is drained: download the shard in one batch,
+    score every ticker with the screener pipeline and post back the matches
+    """
+    from market_data import fetch_ohlcv_batch
+    from screener import build_screener_pipeline
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = WorkQueue(db_name)
+    pipeline = build_screener_pipeline()
+    print(f"👷 Worker {worker_id} started")
+
+    while True:
+        claimed = queue.claim(worker_id, run_id)
+        if not claimed:
+            if exit_when_idle and not queue.has_open_shards(run_id):
+                print(f"👷 Worker {worker_id} idle — exiting")
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        shard_run_id, shard_no, tickers = claimed
+        print(f"👷 {worker_id} processing shard {shard_no} of run {shard_run_id} ({len(tickers)} tickers)")
+        frames = fetch_ohlcv_batch(tickers, period="6mo")
+        matches = []
+        for ticker in tickers:
+            stock = pipeline.process(ticker, frames.get(ticker))["result"]
+            if stock:
+                matches.append(stock)
+            queue.heartbeat(shard_run_id, shard_no, worker_id)
+
+        if not queue.complete(shard_run_id, shard_no, worker_id, matches):
+            print(f"⚠️ Shard {shard_no} was re-assigned before {worker_id} finished; result dropped")
+
+
+def _worker_process(db_name, run_id):
+    run_worker(db_name=db_name, run_id=run_id)
+
+
+def run_queue_screener(local_workers=2, shard_size=SHARD_SIZE, db_name=WORK_QUEUE_DB, job=None):
+    """
+    Coordinator: enqueue the universe, start local worker processes (one per
+    CPU core at most; other processes sharing the queue file may join), wait
+    for every shard and merge the matches into a single screener_batches row.
+    A run with failed shards is marked failed and nothing is stored.
+    """
+    from parallel_screener import resolve_workers
+    from screener import fetch_nifty_stocks, store_screener_matches
+    from universe_metadata import UniverseMetadata
+
+    local_workers = min(resolve_workers(local_workers), os.cpu_count() or 1)
+
+    tickers = UniverseMetadata().tradable(fetch_nifty_stocks())
+    queue = WorkQueue(db_name)
+    run_id = queue.enqueue_run(tickers, shard_size=shard_size)
+    total_shards = len(range(0, len(tickers), shard_size))
+    if job:
+        job.set_total(len(tickers))
+
+    ctx = get_context("spawn")
+    processes = [ctx.Process(target=_worker_process, args=(db_name, run_id), daemon=True)
+                 for _ in range(local_workers)]
+    for process in processes:
+        process.start()
+
+    while queue.has_open_shards(run_id):
+        if job and job.cancelled:
+            break
+        queue.requeue_expired()
+        status = queue.progress(run_id)
+        if job:
+            job.set_processed(queue.done_tickers(run_id))
+        print(f"⏳ Run {run_id}: {status}")
+        time.sleep(POLL_INTERVAL)
+
+    for process in processes:
+        if job and job.cancelled:
+            process.terminate()
+        process.join()
+
+    if job and job.cancelled:
+        print(f"🛑 Queue run {run_id} cancelled — nothing stored.")
+        return {"run_id": run_id, "stored": False}
+
+    status = queue.progress(run_id)
+    if job:
+        job.set_processed(queue.done_tickers(run_id))
+    if status.get("failed"):
+        # A short batch would read as "no matches" for the missing tickers
+        missing = queue.failed_tickers(run_id)
+        queue.fail_run(run_id)
+        if job:
+            job.tick(0, errors=status["failed"])
+        raise RuntimeError(
+            f"Queue run {run_id}: {status['failed']}/{total_shards} shards failed "
+            f"({len(missing)}/{len(tickers)} tickers unscreened) — nothing stored"
+        )
+    matches = queue.merged_matches(run_id)
+    if job:
+        job.tick(0, qualified=len(matches))
+    result = store_screener_matches(matches, source="queue")
+    queue.finish_run(run_id, result.get("batch_id"))
+    print(f"✅ Queue run {run_id} merged: {status.get('done', 0)}/{total_shards} shards, {len(matches)} matches")
+    return {"run_id": run_id, "shards": status, **result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded screener work queue")
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("--db", default=WORK_QUEUE_DB)
+    parser.add_argument("--workers", type=int, default=2, help="local worker processes (coordinator)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--run-id", default=None, help="only claim shards of this run (worker)")
+    parser.add_argument("--stay", action="store_true", help="keep polling when the queue is empty (worker)")
+    args = parser.parse_args()
+
+    if args.role == "coordinator":
+        run_queue_screener(local_workers=args.workers, shard_size=args.shard_size, db_name=args.db)
+    else:
+        run_worker(db_name=args.db, run_id=args.run_id, exit_when_idle=not args.stay)
@@ -0,0 +1,291 @@
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from supabase import create_client, Client
+from indicators import SUPABASE_URL, SUPABASE_KEY, send_telegram
+from local_store import connect
+from position_book import position_book
+from unit_of_work import bulk_update, insert_once
+
+WRITE_QUEUE_DB = os.getenv("WRITE_QUEUE_DB", "write_queue.db")
+DRAIN_BATCH = 20
+LEASE_SECONDS = 120       # A write claimed by a drainer that died is retried after this
+MAX_ATTEMPTS = 10         # After this the write is parked as 'failed' (DB writes keep blocking their keys)
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+POLL_INTERVAL = 5
+
+
+def _now():
+    return datetime.utcnow()
+
+
+class WriteBehindQueue:
+    """
+    Durable SQLite outbox for Supabase writes and Telegram posts. The trading
+    loop enqueues and moves on; a background drainer applies the writes in
+    order, retrying with backoff. A write is only applied once every earlier
+    write sharing one of its keys (e.g. "trade:<id>") has been applied;
+    alerts wait for the writes before them but never hold up a write.
+    """
+    def __init__(self, db_name=WRITE_QUEUE_DB, client=None):
+        self.supabase: Client = client or create_client(SUPABASE_URL, SUPABASE_KEY)
+        self.conn = connect(db_name)
+        self.conn.executescript("""
+            create table if not exists write_queue (
+                seq integer primary key autoincrement,
+                kind text not null,
+                payload_json text not null,
+                status text not null,
+                attempts integer not null default 0,
+                next_attempt text not null,
+                worker_id text,
+                lease_expires text,
+                error text,
+                created_at text not null
+            );
+            create table if not exists write_queue_keys (
+                key text not null,
+                seq integer not null,
+                primary key (key, seq)
+            );
+            create index if not exists write_queue_keys_seq_idx on write_queue_keys (seq);
+            create index if not exists write_queue_status_idx on write_queue (status, next_attempt);
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._drainer = None
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        # BUYs left queued by a previous process count against position limits too
+        for row in self.conn.execute(
+            "select payload_json from write_queue where kind = 'insert' and status <> 'failed'"
+        ).fetchall():
+            self._reserve_buys(json.loads(row["payload_json"]))
+
+    @staticmethod
+    def _buys(payload):
+        if payload["table"] != "trades":
+            return []
+        return [row for row in payload["rows"] if row.get("action") == "BUY"]
+
+    def _reserve_buys(self, payload):
+        """Queued BUYs show in the position book (has_open_position, RiskManager limits) until they land"""
+        for row in self._buys(payload):
+            position_book.reserve_buy(row["ticker"], row)
+
+    def _release_buys(self, payload):
+        for row in self._buys(payload):
+            position_book.release_buy(row["ticker"])
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    def enqueue(self, kind, payload, keys=()):
+        now = _now().isoformat()
+        with self._lock, self.conn:
+            cur = self.conn.execute(
+                "insert into write_queue (kind, payload_json, status, next_attempt, created_at) "
+                "values (?, ?, 'queued', ?, ?)",
+                (kind, json.dumps(payload, default=str), now, now)
+            )
+            self.conn.executemany(
+                "insert or ignore into write_queue_keys (key, seq) values (?, ?)",
+                [(key, cur.lastrowid) for key in dict.fromkeys(keys)]
+            )
+        self.start()
+        self._wake.set()
+        return cur.lastrowid
+
+    def insert(self, table, rows, keys=()):
+        payload = {"table": table, "rows": rows}
+        self._reserve_buys(payload)
+        try:
+            return self.enqueue("insert", payload, keys)
+        except Exception:
+            self._release_buys(payload)
+            raise
+
+    def update(self, table, rows, keys=()):
+        """rows: [{"id": ..., **fields}], applied as UPDATEs by id"""
+        return self.enqueue("update", {"table": table, "rows": rows}, keys)
+
+    def telegram(self, message, keys=()):
+        """keys: the writes the alert reports on; it is sent after they land"""
+        return self.enqueue("telegram", {"message": message}, keys)
+
+    def pending_keys(self):
+        """Keys of every write not yet applied (queued, in flight or parked); alerts don't count"""
+        with self._lock:
+            rows = self.conn.execute(
+                "select distinct k.key from write_queue_keys k join write_queue w on w.seq = k.seq "
+                "where w.kind <> 'telegram'"
+            ).fetchall()
+        return {row["key"] for row in rows}
+
+    def status(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "select status, count(*) as n, min(created_at) as oldest from write_queue group by status"
+            ).fetchall()
+        return {row["status"]: {"count": row["n"], "oldest": row["oldest"]} for row in rows}
+
+    def retry_failed(self):
+        """Put parked writes back in the queue"""
+        with self._lock, self.conn:
+            inserts = self.conn.execute(
+                "select payload_json from write_queue where kind = 'insert' and status = 'failed'"
+            ).fetchall()
+            cur = self.conn.execute(
+                "update write_queue set status = 'queued', attempts = 0, next_attempt = ? where status = 'failed'",
+                (_now().isoformat(),)
+            )
+        for row in inserts:
+            self._reserve_buys(json.loads(row["payload_json"]))
+        self._wake.set()
+        return cur.rowcount
+
+    # ------------------------------------------------------------------
+    # Drainer
+    # ------------------------------------------------------------------
+    def claim(self, limit=DRAIN_BATCH):
+        """
+        Claim the oldest ready writes whose keys have no earlier write still
+        pending (for DB writes, pending alerts don't count); returns
+        [(seq, kind, payload)]
+        """
+        now = _now()
+        lease = (now + timedelta(seconds=LEASE_SECONDS)).isoformat()
+        with self._lock:
+            self.conn.execute("begin immediate")
+            try:
+                self.conn.execute(
+                    "update write_queue set status = 'queued', worker_id = null, lease_expires = null "
+                    "where status = 'claimed' and lease_expires < ?",
+                    (now.isoformat(),)
+                )
+                rows = self.conn.execute("""
+                    select seq, kind, payload_json from write_queue w
+                    where status = 'queued' and next_attempt <= ?
+                      and not exists (
+                        select 1 from write_queue_keys k
+                        join write_queue_keys earlier on earlier.key = k.key and earlier.seq < k.seq
+                        join write_queue e on e.seq = earlier.seq
+                        where k.seq = w.seq and (e.kind <> 'telegram' or w.kind = 'telegram')
+                      )
+                    order by seq limit ?
+                """, (now.isoformat(), limit)).fetchall()
+                self.conn.executemany(
+                    "update write_queue set status = 'claimed', worker_id = ?, lease_expires = ?, "
+                    "attempts = attempts + 1 where seq = ?",
+                    [(self.worker_id, lease, row["seq"]) for row in rows]
+                )
+                self.conn.execute("commit")
+            except Exception:
+                self.conn.execute("rollback")
+                raise
+        return [(row["seq"], row["kind"], json.loads(row["payload_json"])) for row in rows]
+
+    def _apply(self, kind, payload):
+        if kind == "insert":
+            # Retried until it succeeds, so rows carry an order_id to insert once
+            rows = insert_once(self.supabase, payload["table"], payload["rows"])
+            if payload["table"] == "trades":
+                for row in rows:
+                    position_book.record_buy(row)
+                if len(rows) < len(payload["rows"]):
+                    position_book.invalidate()  # Some landed on an earlier attempt; reload them
+                self._release_buys(payload)
+        elif kind == "update":
+            bulk_update(self.supabase, payload["table"], {row["id"]: {
+                k: v for k, v in row.items() if k != "id"
+            } for row in payload["rows"]})
+        elif kind == "telegram":
+            if not send_telegram(payload["message"]):
+                raise RuntimeError("Telegram post failed")
+        else:
+            raise ValueError(f"Unknown write kind: {kind}")
+
+    def _complete(self, seq):
+        with self._lock, self.conn:
+            self.conn.execute("delete from write_queue_keys where seq = ?", (seq,))
+            self.conn.execute("delete from write_queue where seq = ?", (seq,))
+
+    def _fail(self, seq, error):
+        """Schedule a retry, or park the write after MAX_ATTEMPTS; returns True once parked"""
+        with self._lock, self.conn:
+            row = self.conn.execute("select kind, attempts from write_queue where seq = ?", (seq,)).fetchone()
+            kind, attempts = row["kind"], row["attempts"]
+            if attempts < MAX_ATTEMPTS:
+                delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+                self.conn.execute(
+                    "update write_queue set status = 'queued', error = ?, lease_expires = null, next_attempt = ? "
+                    "where seq = ?",
+                    (error, (_now() + timedelta(seconds=delay)).isoformat(), seq)
+                )
+            else:
+                self.conn.execute(
+                    "update write_queue set status = 'failed', error = ?, lease_expires = null where seq = ?",
+                    (error, seq)
+                )
+                keys = [k["key"] for k in self.conn.execute(
+                    "select key from write_queue_keys where seq = ?", (seq,)
+                ).fetchall()]
+                if kind == "telegram":
+                    # An undeliverable alert holds nothing up; later alerts go ahead
+                    self.conn.execute("delete from write_queue_keys where seq = ?", (seq,))
+
+        if attempts < MAX_ATTEMPTS:
+            print(f"⚠️ Write {seq} failed (attempt {attempts}), retrying in {delay}s: {error}")
+            return False
+        print(f"❌ Write {seq} parked after {attempts} attempts: {error}")
+        if kind != "telegram":
+            # Later writes for these keys wait until /write-queue?retry_failed=true
+            send_telegram(f"❌ Queued {kind} {seq} parked after {attempts} attempts, "
+                          f"blocking {', '.join(keys) or 'no keys'}: {error}")
+        return True
+
+    def drain_once(self):
+        """Apply one batch of ready writes; returns how many were applied"""
+        applied = 0
+        for seq, kind, payload in self.claim():
+            try:
+                self._apply(kind, payload)
+            except Exception as e:
+                if self._fail(seq, str(e)) and kind == "insert":
+                    self._release_buys(payload)  # Parked: no longer counted as a position
+                continue
+            self._complete(seq)
+            applied += 1
+        return applied
+
+    def drain(self, timeout=60):
+        """Apply writes until nothing is ready or timeout passes (for scripts about to exit)"""
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.drain_once():
+            pass
+
+    def _run(self):
+        while True:
+            try:
+                if self.drain_once():
+                    continue
+            except Exception as e:
+                print(f"⚠️ Write queue drainer error: {e}")
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background drainer once per process"""
+        with self._lock:
+            if self._drainer and self._drainer.is_alive():
+                return
+            self._drainer = threading.Thread(target=self._run, name="write-queue-drainer", daemon=True)
+            self._drainer.start()
+            print("📤 Write queue drainer started")
+
+
+write_queue = WriteBehindQueue()